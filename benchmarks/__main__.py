@@ -0,0 +1,119 @@
+import os
+import sys
+import json
+import argparse
+import platform
+from datetime import datetime, timezone
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+def parse_args(argv):
+    from benchmarks.seed import SIZES
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark every API route.")
+    parser.add_argument("--size", choices=SIZES, default="tiny", help="data set preset (default tiny)")
+    parser.add_argument("--blogs", type=int)
+    parser.add_argument("--products", type=int)
+    parser.add_argument("--categories", type=int)
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--mongo-uri", help="run against a real MongoDB instead of the in-memory stand-in")
+    parser.add_argument("--db", default="cdc_benchmark", help="database to seed and query (default cdc_benchmark)")
+    parser.add_argument("--no-seed", action="store_true", help="reuse the data already in --db")
+    parser.add_argument("--mode", choices=("client", "server", "both"), default="both")
+    parser.add_argument("--requests", type=int, default=100, help="timed requests per route")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed requests per route")
+    parser.add_argument("--concurrency", type=int, default=8, help="clients (and waitress threads) in server mode")
+    parser.add_argument("--route", action="append", help="only routes whose name contains this (repeatable)")
+    parser.add_argument("--baseline", default=BASELINE, help="results to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run to --baseline")
+    parser.add_argument("--tolerance", type=float, default=50.0, help="p50 slowdown (percent) reported as a regression (default 50)")
+    parser.add_argument("--min-delta", type=float, default=1.0, help="smallest p50 slowdown (ms) reported as a regression")
+    parser.add_argument("--output", help="also write the results as JSON here")
+    args = parser.parse_args(argv)
+    if args.mongo_uri and not args.no_seed and "bench" not in args.db:
+        parser.error("refusing to drop and seed a database whose name does not contain 'bench'")
+    return args
+
+def main(argv):
+    args = parse_args(argv)
+
+    # config.py reads the environment at import, so set it before anything imports the app
+    os.environ["DB_NAME"] = args.db
+    os.environ["MONGO_URI"] = args.mongo_uri or "mongodb://stand-in"
+    os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret-key-at-least-32-bytes")
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    # Warm-up queries would run alongside the seeding and count towards the first route
+    os.environ["START_BACKGROUND_TASKS"] = "false"
+
+    from benchmarks.seed import SIZES, seed
+    from benchmarks.stand_in import install_stand_in, count_real_commands, ops
+    if args.mongo_uri:
+        count_real_commands()
+    else:
+        install_stand_in()
+    from db.mongo_client import get_db
+    db = get_db()
+
+    blogs, products, categories, users = SIZES[args.size]
+    sizes = {
+        "blogs": args.blogs or blogs,
+        "products": args.products or products,
+        "categories": args.categories or categories,
+        "users": args.users or users,
+    }
+    if not args.no_seed:
+        print(f"seeding {sizes} ...", flush=True)
+        with ops.paused():
+            seed(db, **sizes)
+
+    from server.app import app
+    from benchmarks.scenarios import SCENARIOS, Context
+    from benchmarks.runner import run_client, run_server, print_report, compare, print_comparison
+    with ops.paused():
+        ctx = Context(app, db)
+    names = [name for name in SCENARIOS if not args.route or any(part in name for part in args.route)]
+
+    results = {}
+    if args.mode in ("client", "both"):
+        results["client"] = run_client(app, ctx, names, args.requests, args.warmup)
+        print_report("test client (serial)", results["client"])
+    if args.mode in ("server", "both"):
+        results["server"] = run_server(app, ctx, names, args.requests, args.warmup, args.concurrency)
+        print_report(f"waitress ({args.concurrency} concurrent clients)", results["server"])
+
+    run = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "mongo": "real" if args.mongo_uri else "stand-in",
+            "sizes": sizes,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "concurrency": args.concurrency,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(run, f, indent=2)
+
+    status = 0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["meta"]["sizes"] != sizes or baseline["meta"]["mongo"] != run["meta"]["mongo"]:
+            print(f"\nbaseline was recorded with {baseline['meta']['mongo']} Mongo and {baseline['meta']['sizes']}; "
+                  "latencies are not comparable")
+        print_comparison(run, baseline)
+        regressions = compare(run, baseline, args.tolerance, args.min_delta)
+        for mode, name, message in regressions:
+            print(f"REGRESSION {mode} {name}: {message}")
+        status = 1 if regressions else 0
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(run, f, indent=2)
+        print(f"\nbaseline written to {args.baseline}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,166 @@
+import json
+import time
+import logging
+import threading
+import http.client
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from waitress import create_server, wasyncore
+from benchmarks.stand_in import ops
+from benchmarks.scenarios import SCENARIOS
+
+def percentile(sorted_values, fraction):
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+def summarize(latencies, statuses, elapsed, ops_before):
+    ops_used = ops.snapshot() - ops_before
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "requests": count,
+        "throughput": round(count / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "ops_per_request": round(sum(ops_used.values()) / count, 2),
+        "ops": dict(sorted(ops_used.items())),
+        "statuses": dict(sorted(Counter(str(status) for status in statuses).items())),
+    }
+
+def _build(ctx, name, count):
+    # Requests are built (and any setup documents inserted) before timing starts
+    requests = [SCENARIOS[name](ctx) for _ in range(count)]
+    for request in requests:
+        request["path"] = quote(request["path"], safe="/?=&,:")
+    return requests
+
+def run_client(app, ctx, names, count, warmup):
+    # Serial requests through the Flask test client: the cost of the app itself, no network
+    client = app.test_client()
+
+    def send(request):
+        start = time.perf_counter()
+        response = client.open(request["path"], method=request["method"], json=request["json"], headers=request["headers"])
+        response.get_data()
+        return response.status_code, time.perf_counter() - start
+
+    results = {}
+    for name in names:
+        ctx.reseed(name)
+        for request in _build(ctx, name, warmup):
+            send(request)
+        requests = _build(ctx, name, count)
+        ops_before = ops.snapshot()
+        timings = [send(request) for request in requests]
+        latencies = [latency for _, latency in timings]
+        results[name] = summarize(latencies, [status for status, _ in timings], sum(latencies), ops_before)
+    return results
+
+def run_server(app, ctx, names, count, warmup, concurrency):
+    # Concurrent keep-alive HTTP clients against the app served by waitress. Queued requests
+    # are the point of the exercise, so waitress's queue depth warnings are silenced.
+    logging.getLogger("waitress.queue").setLevel(logging.ERROR)
+    socket_map = {}
+    server = create_server(app, map=socket_map, host="127.0.0.1", port=0, threads=concurrency)
+    port = server.effective_port
+    stopping = threading.Event()
+
+    def serve():
+        # server.run() loops forever; step the loop so it can be stopped before closing sockets
+        while not stopping.is_set():
+            wasyncore.loop(timeout=0.1, map=socket_map, count=1)
+
+    loop = threading.Thread(target=serve, name="benchmark-server", daemon=True)
+    loop.start()
+    local = threading.local()
+    connections = []
+
+    def send(request):
+        if getattr(local, "connection", None) is None:
+            local.connection = http.client.HTTPConnection("127.0.0.1", port, timeout=120)
+            connections.append(local.connection)
+        headers = dict(request["headers"])
+        body = None
+        if request["json"] is not None:
+            body = json.dumps(request["json"]).encode()
+            headers["Content-Type"] = "application/json"
+        start = time.perf_counter()
+        try:
+            local.connection.request(request["method"], request["path"], body, headers)
+            response = local.connection.getresponse()
+            response.read()
+            status = response.status
+        except (http.client.HTTPException, OSError):
+            local.connection.close()
+            local.connection = None
+            status = "error"
+        return status, time.perf_counter() - start
+
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for name in names:
+                ctx.reseed(name)
+                list(pool.map(send, _build(ctx, name, warmup)))
+                requests = _build(ctx, name, count)
+                ops_before = ops.snapshot()
+                start = time.perf_counter()
+                timings = list(pool.map(send, requests))
+                elapsed = time.perf_counter() - start
+                results[name] = summarize([latency for _, latency in timings], [status for status, _ in timings], elapsed, ops_before)
+    finally:
+        for connection in connections:
+            connection.close()
+        stopping.set()
+        loop.join()
+        server.task_dispatcher.shutdown()
+        wasyncore.close_all(socket_map)
+    return results
+
+def print_report(mode, results):
+    print(f"\n{mode}")
+    print(f"{'route':<38} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'ops/req':>8}  statuses")
+    for name, result in results.items():
+        statuses = " ".join(f"{status}x{n}" for status, n in result["statuses"].items())
+        print(f"{name:<38} {result['throughput']:>9.1f} {result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} "
+              f"{result['ops_per_request']:>8.2f}  {statuses}")
+
+# Extra Mongo operations per request tolerated before a route counts as regressed: cache
+# expiry and background refreshes move the average by a few hundredths between runs
+OPS_SLACK = 0.1
+
+def compare(current, baseline, tolerance, min_delta):
+    # Returns (mode, route, message) for each route that got slower than `tolerance` percent
+    # and at least `min_delta` ms, or issues more Mongo operations per request than the
+    # baseline run did. Sub-millisecond p50s swing by more than any percentage from run to
+    # run, hence the floor. Server-mode latencies on the stand-in are mostly threads queueing
+    # for the GIL behind mongomock's scans and vary too much to gate; they are only printed.
+    # Op counts depend on cache hits, so they are only compared when both runs sent the same requests.
+    same_requests = all(current["meta"][key] == baseline["meta"][key] for key in ("sizes", "requests", "warmup"))
+    stand_in = current["meta"]["mongo"] == "stand-in"
+    regressions = []
+    for mode, results in current.get("results", {}).items():
+        for name, result in results.items():
+            before = baseline.get("results", {}).get(mode, {}).get(name)
+            if not before:
+                continue
+            if same_requests and result["ops_per_request"] > before["ops_per_request"] + OPS_SLACK:
+                regressions.append((mode, name, f"ops/req {before['ops_per_request']} -> {result['ops_per_request']}"))
+            if stand_in and mode == "server":
+                continue
+            change = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0
+            if change > tolerance and result["p50_ms"] - before["p50_ms"] >= min_delta:
+                regressions.append((mode, name, f"p50 {before['p50_ms']}ms -> {result['p50_ms']}ms (+{change:.0f}%)"))
+    return regressions
+
+def print_comparison(current, baseline):
+    print("\nchange against baseline (p50 / req/s / ops per request)")
+    for mode, results in current.get("results", {}).items():
+        for name, result in results.items():
+            before = baseline.get("results", {}).get(mode, {}).get(name)
+            if not before:
+                continue
+            p50 = (result["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100 if before["p50_ms"] else 0
+            rps = (result["throughput"] - before["throughput"]) / before["throughput"] * 100 if before["throughput"] else 0
+            ops_change = result["ops_per_request"] - before["ops_per_request"]
+            print(f"{mode:<7} {name:<38} {p50:>+7.1f}% {rps:>+7.1f}% {ops_change:>+7.2f}")
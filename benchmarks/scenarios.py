@@ -0,0 +1,128 @@
+import random
+import threading
+from datetime import datetime
+from bson import ObjectId
+from flask_jwt_extended import create_access_token, create_refresh_token
+from benchmarks.stand_in import ops
+from benchmarks.seed import PASSWORD
+
+class Context:
+    # Ids and tokens the scenarios draw from. Setup writes (documents for DELETE routes to
+    # remove) go straight to Mongo and are not counted against the route.
+    def __init__(self, app, db, seed=2):
+        self.app = app
+        self.db = db
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._serial = 0
+        self.username = "user1"
+        self.product_ids = [p["_id"] for p in db.products.find({}, {"_id": 1}).limit(1000)]
+        # PUT /blogs/<id> renames the user's own posts, so titles come from other authors
+        self.blog_titles = [b["title"] for b in db.blogs.find({"status": "published", "author": {"$ne": self.username}}, {"title": 1}).limit(1000)]
+        self.blog_ids = [b["_id"] for b in db.blogs.find({}, {"_id": 1}).limit(1000)]
+        self.own_blog_ids = [b["_id"] for b in db.blogs.find({"author": self.username}, {"_id": 1}).limit(100)]
+        self.categories = list(db.categories.find({}, {"name": 1}))
+        with app.app_context():
+            self.auth = {"Authorization": f"Bearer {create_access_token(identity=self.username)}"}
+            self.refresh = {"Authorization": f"Bearer {create_refresh_token(identity=self.username)}"}
+
+    def reseed(self, name):
+        # Each scenario draws the same ids whichever routes run before it
+        with self._lock:
+            self._rng = random.Random(f"{self.seed}:{name}")
+
+    def pick(self, values):
+        with self._lock:
+            return self._rng.choice(values)
+
+    def serial(self):
+        with self._lock:
+            self._serial += 1
+            return self._serial
+
+    def fresh_token(self):
+        with self.app.app_context():
+            return {"Authorization": f"Bearer {create_access_token(identity=self.username)}"}
+
+    def throwaway(self, collection, doc):
+        with ops.paused(), self._lock:
+            return str(self.db.get_collection(collection).insert_one(doc).inserted_id)
+
+    def product(self):
+        return {"name": f"Bench product {self.serial()}", "images": ["a.jpg"], "imageKeys": ["a.jpg"],
+                "description": "A product created by the benchmark", "price": 10.0,
+                "categoryId": str(self.pick(self.categories)["_id"])}
+
+    def blog(self):
+        return {"title": f"Bench blog {self.serial()}", "content": "Written by the benchmark " * 40,
+                "image": "b.jpg", "imageKey": "b.jpg", "status": "published"}
+
+def request(method, path, json=None, headers=None):
+    return {"method": method, "path": path, "json": json, "headers": headers or {}}
+
+def _delete_blog(ctx):
+    blog_id = ctx.throwaway("blogs", dict(ctx.blog(), author=ctx.username, created_at=datetime.utcnow()))
+    return request("DELETE", f"/api/blogs/{blog_id}", headers=ctx.auth)
+
+def _update_category(ctx):
+    # Same name as before, so repeated runs leave the data set unchanged
+    category = ctx.pick(ctx.categories)
+    return request("PUT", f"/api/categories/{category['_id']}", {"name": category["name"], "image": "c.jpg", "imageKey": "c.jpg"})
+
+def _delete_category(ctx):
+    category_id = ctx.throwaway("categories", {"name": f"Doomed {ctx.serial()}", "image": "c.jpg", "imageKey": "c.jpg",
+                                               "created_at": datetime.utcnow(), "updated_at": datetime.utcnow()})
+    return request("DELETE", f"/api/categories/{category_id}", headers=ctx.auth)
+
+# name -> builder(ctx) returning the request to send; one entry per route (and per mode
+# for routes with distinct code paths such as page vs cursor pagination)
+SCENARIOS = {
+    # products
+    "POST /products": lambda ctx: request("POST", "/api/products", ctx.product(), ctx.auth),
+    "GET /products": lambda ctx: request("GET", "/api/products"),
+    "GET /products?format=ndjson": lambda ctx: request("GET", "/api/products?format=ndjson"),
+    "GET /products?fields": lambda ctx: request("GET", "/api/products?fields=name,price,images"),
+    "POST /products/filter (page)": lambda ctx: request("POST", "/api/products/filter", {"page": 3, "limit": 20, "keyword": "boot"}),
+    "POST /products/filter (cursor)": lambda ctx: request("POST", "/api/products/filter", {"cursor": "", "limit": 20, "keyword": "boot", "include_total": "false"}),
+    "GET /products/<id>": lambda ctx: request("GET", f"/api/products/{ctx.pick(ctx.product_ids)}"),
+    "PUT /products/<id>": lambda ctx: request("PUT", f"/api/products/{ctx.pick(ctx.product_ids)}", ctx.product(), ctx.auth),
+    "DELETE /products/<id>": lambda ctx: request("DELETE", f"/api/products/{ctx.throwaway('products', ctx.product())}", headers=ctx.auth),
+    "POST /products/bulk": lambda ctx: request("POST", "/api/products/bulk", [{"op": "create", "data": ctx.product()} for _ in range(20)], ctx.auth),
+    "GET /products/category/<id>": lambda ctx: request("GET", f"/api/products/category/{ctx.pick(ctx.categories)['_id']}"),
+    "GET /products/category/<name>/name": lambda ctx: request("GET", f"/api/products/category/{ctx.pick(ctx.categories)['name']}/name?page=1&per_page=20"),
+    "GET /products/ids": lambda ctx: request("GET", "/api/products/ids"),
+    "POST /update-product-fields": lambda ctx: request("POST", "/api/update-product-fields"),
+    # blogs
+    "POST /blogs": lambda ctx: request("POST", "/api/blogs", ctx.blog(), ctx.auth),
+    "GET /blogs/all": lambda ctx: request("GET", "/api/blogs/all"),
+    "GET /blogs (page)": lambda ctx: request("GET", "/api/blogs?page=5&per_page=20"),
+    "GET /blogs (cursor)": lambda ctx: request("GET", "/api/blogs?cursor=&per_page=20&include_total=false"),
+    "GET /blogs/<id>": lambda ctx: request("GET", f"/api/blogs/{ctx.pick(ctx.blog_ids)}"),
+    "GET /blogs/<title>/name": lambda ctx: request("GET", f"/api/blogs/{ctx.pick(ctx.blog_titles)}/name"),
+    "PUT /blogs/<id>": lambda ctx: request("PUT", f"/api/blogs/{ctx.pick(ctx.own_blog_ids)}", {"title": f"Edited {ctx.serial()}", "status": "published"}, ctx.auth),
+    "DELETE /blogs/<id>": _delete_blog,
+    "POST /blogs/bulk": lambda ctx: request("POST", "/api/blogs/bulk", [{"op": "create", "data": ctx.blog()} for _ in range(20)], ctx.auth),
+    "GET /blogs/user": lambda ctx: request("GET", "/api/blogs/user?page=1&per_page=20", headers=ctx.auth),
+    "POST /blogs/filter": lambda ctx: request("POST", "/api/blogs/filter", {"keyword": "guide", "page": 1, "per_page": 20}),
+    # categories
+    "GET /categories": lambda ctx: request("GET", "/api/categories"),
+    "POST /categories": lambda ctx: request("POST", "/api/categories", {"name": f"Bench category {ctx.serial()}", "image": "c.jpg", "imageKey": "c.jpg"}),
+    "PUT /categories/<id>": _update_category,
+    "DELETE /categories/<id>": _delete_category,
+    "GET /categories/<id>": lambda ctx: request("GET", f"/api/categories/{ctx.pick(ctx.categories)['_id']}"),
+    "POST /categories/filter": lambda ctx: request("POST", "/api/categories/filter", {"keyword": "1", "page": 1, "per_page": 20}),
+    "GET /categories/<name>/name": lambda ctx: request("GET", f"/api/categories/{ctx.pick(ctx.categories)['name'].replace(' ', '_')}/name"),
+    # migrations
+    "GET /migrations": lambda ctx: request("GET", "/api/migrations", headers=ctx.auth),
+    "POST /migrations": lambda ctx: request("POST", "/api/migrations", headers=ctx.auth),
+    # users
+    "POST /register": lambda ctx: request("POST", "/api/register", {"username": f"bench{ctx.serial()}-{ObjectId()}", "password": PASSWORD, "role": "user"}),
+    "POST /login": lambda ctx: request("POST", "/api/login", {"username": ctx.username, "password": PASSWORD}),
+    "GET /protected": lambda ctx: request("GET", "/api/protected", headers=ctx.auth),
+    "GET /refresh": lambda ctx: request("GET", "/api/refresh", headers=ctx.refresh),
+    "POST /logout": lambda ctx: request("POST", "/api/logout", headers=ctx.fresh_token()),
+    "GET /isTokenExpired": lambda ctx: request("GET", "/api/isTokenExpired", headers=ctx.auth),
+    # app
+    "GET /stats": lambda ctx: request("GET", "/api/stats"),
+}
@@ -0,0 +1,97 @@
+import random
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+from db.projection import make_excerpt
+from db.indexes import ensure_indexes
+from db.slugs import slugify
+
+SIZES = {
+    # name: (blogs, products, categories, users)
+    "tiny": (1_000, 1_000, 50, 20),
+    "small": (10_000, 10_000, 200, 100),
+    "medium": (100_000, 100_000, 500, 1_000),
+    "large": (1_000_000, 1_000_000, 500, 10_000),
+}
+
+BATCH = 10_000
+PASSWORD = "benchmark"
+WORDS = ("shoe boot leather canvas summer winter classic running trail city sport light heavy red "
+         "blue green black white vintage modern travel guide review story news update").split()
+EPOCH = datetime(2024, 1, 1)
+
+def _text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+def _insert(collection, docs):
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) == BATCH:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+def seed(db, blogs, products, categories, users, seed=1):
+    # Drops and refills the blogs, products, categories and users collections of `db`
+    rng = random.Random(seed)
+    for name in ("blogs", "products", "categories", "users", "token_blocklist", "migrations"):
+        db.drop_collection(name)
+
+    password = generate_password_hash(PASSWORD)
+    usernames = [f"user{i}" for i in range(users)]
+    _insert(db.users, ({"username": name, "password": password, "role": "admin" if i == 0 else "user"}
+                       for i, name in enumerate(usernames)))
+
+    category_docs = [{
+        "name": f"Category {i}",
+        "slug": f"category-{i}",
+        "image": f"https://img.example/categories/{i}.jpg",
+        "imageKey": f"categories/{i}.jpg",
+        "created_at": EPOCH + timedelta(minutes=i),
+        "updated_at": EPOCH + timedelta(minutes=i),
+    } for i in range(categories)]
+    db.categories.insert_many(category_docs)
+
+    def product_docs():
+        for i in range(products):
+            description = _text(rng, 60)
+            created = EPOCH + timedelta(seconds=i)
+            category = rng.choice(category_docs)
+            yield {
+                "name": f"{_text(rng, 2).title()} {i}",
+                "images": [f"https://img.example/products/{i}/{n}.jpg" for n in range(3)],
+                "imageKeys": [f"products/{i}/{n}.jpg" for n in range(3)],
+                "description": description,
+                "excerpt": make_excerpt(description),
+                "content": _text(rng, 200),
+                "price": round(rng.uniform(5, 500), 2),
+                "currency": "EUR",
+                "categoryId": category["_id"],
+                "categoryName": category["name"],
+                "categoryImage": category["image"],
+                "createdAt": created,
+                "updatedAt": created,
+            }
+
+    def blog_docs():
+        for i in range(blogs):
+            content = _text(rng, 300)
+            created = EPOCH + timedelta(seconds=i)
+            title = f"{_text(rng, 3).title()} {i}"
+            yield {
+                "title": title,
+                "slug": slugify(title),
+                "content": content,
+                "excerpt": make_excerpt(content),
+                "image": f"https://img.example/blogs/{i}.jpg",
+                "imageKey": f"blogs/{i}.jpg",
+                "author": usernames[i % len(usernames)],
+                "status": "published" if rng.random() < 0.8 else "draft",
+                "created_at": created,
+                "updated_at": created,
+            }
+
+    _insert(db.products, product_docs())
+    _insert(db.blogs, blog_docs())
+    ensure_indexes(db)
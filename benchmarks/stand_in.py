@@ -0,0 +1,93 @@
+import threading
+from collections import Counter
+from pymongo import monitoring
+
+# Commands that are driver housekeeping rather than work done for a request
+IGNORED_COMMANDS = {"hello", "isMaster", "ismaster", "ping", "endSessions", "saslStart", "saslContinue", "buildInfo"}
+
+# Collection methods counted on the mongomock stand-in; nested calls (find_one -> find) count once
+COUNTED_METHODS = (
+    "find", "find_one", "aggregate", "count_documents", "estimated_document_count", "distinct",
+    "insert_one", "insert_many", "update_one", "update_many", "replace_one", "delete_one", "delete_many",
+    "find_one_and_update", "find_one_and_delete", "find_one_and_replace", "bulk_write", "create_index",
+)
+
+class OpCounter:
+    # Counts Mongo operations by command name. Operations issued while a thread has paused
+    # counting (benchmark setup, e.g. inserting a document for a DELETE to remove) are skipped.
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.counts = Counter()
+
+    def record(self, name):
+        if getattr(self._local, "paused", False):
+            return
+        with self._lock:
+            self.counts[name] += 1
+
+    def total(self):
+        with self._lock:
+            return sum(self.counts.values())
+
+    def snapshot(self):
+        with self._lock:
+            return Counter(self.counts)
+
+    def paused(self):
+        counter = self
+        class _Paused:
+            def __enter__(self):
+                counter._local.paused = True
+            def __exit__(self, *exc):
+                counter._local.paused = False
+        return _Paused()
+
+ops = OpCounter()
+
+class CommandCounter(monitoring.CommandListener):
+    def started(self, event):
+        if event.command_name not in IGNORED_COMMANDS:
+            ops.record(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+def count_real_commands():
+    # Registered globally, so it must run before the app creates its MongoClient
+    monitoring.register(CommandCounter())
+
+def install_stand_in():
+    # Swap the app's MongoClient for an in-memory mongomock client and count its calls
+    import mongomock
+    import mongomock.collection
+    from db import mongo_client
+
+    _local = threading.local()
+
+    def counted(name, method):
+        def wrapper(self, *args, **kwargs):
+            if getattr(_local, "depth", 0):
+                return method(self, *args, **kwargs)
+            ops.record(name)
+            _local.depth = 1
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                _local.depth = 0
+        return wrapper
+
+    for name in COUNTED_METHODS:
+        setattr(mongomock.collection.Collection, name, counted(name, getattr(mongomock.collection.Collection, name)))
+
+    # pymongo 4.9+ passes sort= to bulk update builders, which mongomock does not accept
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+    def add_update_without_sort(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+    mongomock.collection.BulkOperationBuilder.add_update = add_update_without_sort
+
+    mongo_client._client = mongomock.MongoClient()
+    return mongo_client._client
@@ -3,9 +3,81 @@ import os
 
 load_dotenv()
 
+def _int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
 config = {  
     "MONGO_URI": os.getenv("MONGO_URI"),
-    "SECRET_KEY": os.getenv("SECRET_KEY")
+    "DB_NAME": os.getenv("DB_NAME"),
+    "SECRET_KEY": os.getenv("SECRET_KEY"),
+    "ENSURE_INDEXES": os.getenv("ENSURE_INDEXES", "true").lower() == "true",
+    "CHECK_QUERY_PLANS": os.getenv("CHECK_QUERY_PLANS", "false").lower() == "true",
+
+    # One MongoClient (and connection pool) is shared by the whole process
+    "MONGO_MAX_POOL_SIZE": _int("MONGO_MAX_POOL_SIZE", 100),
+    "MONGO_MIN_POOL_SIZE": _int("MONGO_MIN_POOL_SIZE", 0),
+    "MONGO_MAX_IDLE_TIME_MS": _int("MONGO_MAX_IDLE_TIME_MS", None),
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS": _int("MONGO_WAIT_QUEUE_TIMEOUT_MS", None),
+    "MONGO_CONNECT_TIMEOUT_MS": _int("MONGO_CONNECT_TIMEOUT_MS", 5000),
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": _int("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000),
+    "MONGO_SOCKET_TIMEOUT_MS": _int("MONGO_SOCKET_TIMEOUT_MS", None),
+    # Comma separated, e.g. "zstd,snappy,zlib"; zstd and snappy need their python packages
+    "MONGO_COMPRESSORS": os.getenv("MONGO_COMPRESSORS"),
+    "MONGO_READ_PREFERENCE": os.getenv("MONGO_READ_PREFERENCE"),
+    "MONGO_READ_CONCERN": os.getenv("MONGO_READ_CONCERN"),
+    "MONGO_WRITE_CONCERN": os.getenv("MONGO_WRITE_CONCERN"),
+    "MONGO_APP_NAME": os.getenv("MONGO_APP_NAME", "cdc-backend"),
+
+    # In-process read cache; entries expire after CACHE_TTL seconds in every worker.
+    # CACHE_INVALIDATION_CHANNEL=true also broadcasts invalidations between workers.
+    "CACHE_TTL": _int("CACHE_TTL", 30),
+    "CACHE_MAX_ENTRIES": _int("CACHE_MAX_ENTRIES", 1024),
+    "CACHE_INVALIDATION_CHANNEL": os.getenv("CACHE_INVALIDATION_CHANNEL", "false").lower() == "true",
+
+    # Password hashing runs in a pool of PASSWORD_HASH_WORKERS processes (0 hashes on the
+    # request thread). Requests beyond the workers plus PASSWORD_HASH_QUEUE get a 503.
+    # Changing PASSWORD_HASH_METHOD (any werkzeug method, e.g. "scrypt:32768:8:1" or
+    # "pbkdf2:sha256:600000") rehashes each password at its owner's next login.
+    "PASSWORD_HASH_METHOD": os.getenv("PASSWORD_HASH_METHOD", "scrypt"),
+    "PASSWORD_HASH_WORKERS": _int("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)),
+    "PASSWORD_HASH_QUEUE": _int("PASSWORD_HASH_QUEUE", 16),
+    "PASSWORD_HASH_TIMEOUT": _int("PASSWORD_HASH_TIMEOUT", 10),
+
+    # How often (seconds) each worker pulls tokens revoked elsewhere into its in-memory blocklist
+    "TOKEN_BLOCKLIST_REFRESH": _int("TOKEN_BLOCKLIST_REFRESH", 5),
+
+    # "orjson" encodes responses with orjson (if installed) wherever the bytes match json's
+    "JSON_PROVIDER": os.getenv("JSON_PROVIDER", "json"),
+
+    # Largest array accepted by the /bulk write endpoints
+    "BULK_MAX_OPERATIONS": _int("BULK_MAX_OPERATIONS", 1000),
+
+    # gunicorn (gunicorn.conf.py): WEB_WORKERS processes with WEB_THREADS threads each. A worker
+    # is replaced after WEB_MAX_REQUESTS requests, plus up to WEB_MAX_REQUESTS_JITTER so they
+    # do not all restart at once (0 disables recycling).
+    "WEB_BIND": os.getenv("WEB_BIND", "127.0.0.1:5000"),
+    "WEB_WORKERS": _int("WEB_WORKERS", os.cpu_count() or 1),
+    "WEB_THREADS": _int("WEB_THREADS", 4),
+    "WEB_MAX_REQUESTS": _int("WEB_MAX_REQUESTS", 10000),
+    "WEB_MAX_REQUESTS_JITTER": _int("WEB_MAX_REQUESTS_JITTER", 1000),
+    "WEB_TIMEOUT": _int("WEB_TIMEOUT", 30),
+    "WEB_GRACEFUL_TIMEOUT": _int("WEB_GRACEFUL_TIMEOUT", 30),
+    # false leaves background work (warm-up, the cache invalidation listener) to the caller;
+    # gunicorn.conf.py starts it in each worker instead of the preloading master
+    "START_BACKGROUND_TASKS": os.getenv("START_BACKGROUND_TASKS", "true").lower() == "true",
+
+    # How long GET /readyz waits for Mongo to answer a ping
+    "READY_TIMEOUT_MS": _int("READY_TIMEOUT_MS", 1000),
+
+    # Requests and Mongo commands at least this slow (milliseconds) are logged; 0 disables
+    "SLOW_REQUEST_MS": _int("SLOW_REQUEST_MS", 1000),
+    "SLOW_QUERY_MS": _int("SLOW_QUERY_MS", 100),
+
+    # /metrics sums the snapshots every worker writes to METRICS_DIR (every
+    # METRICS_WRITE_INTERVAL seconds); unset, it reports this process only
+    "METRICS_DIR": os.getenv("METRICS_DIR", ""),
+    "METRICS_WRITE_INTERVAL": _int("METRICS_WRITE_INTERVAL", 5),
 }
 
 def get_config():
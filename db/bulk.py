@@ -0,0 +1,63 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo.errors import BulkWriteError
+from config import get_config
+
+OPERATIONS = ("create", "update", "delete")
+
+def parse_operations(body):
+    # Body is a JSON array of {"op": "create", "data": {...}},
+    # {"op": "update", "id": "...", "data": {...}} or {"op": "delete", "id": "..."}
+    if not isinstance(body, list):
+        raise ValueError("Expected a JSON array of operations")
+    max_operations = get_config()["BULK_MAX_OPERATIONS"]
+    if len(body) > max_operations:
+        raise ValueError(f"At most {max_operations} operations per request")
+    return body
+
+def operation_error(index, operation):
+    # Returns a per-item result for a malformed operation, or None when it is well formed
+    if not isinstance(operation, dict) or operation.get("op") not in OPERATIONS:
+        return item_result(index, 400, error=f"op must be one of {', '.join(OPERATIONS)}")
+    if operation["op"] != "delete" and not isinstance(operation.get("data"), dict):
+        return item_result(index, 400, error="data must be an object")
+    if operation["op"] != "create":
+        try:
+            ObjectId(operation.get("id"))
+        except (InvalidId, TypeError):
+            return item_result(index, 400, error="Invalid id")
+    return None
+
+def item_result(index, status, _id=None, error=None):
+    result = {"index": index, "status": status}
+    if _id is not None:
+        result["_id"] = str(_id)
+    if error is not None:
+        result["error"] = error
+    return result
+
+def fetch_targets(collection, ids, fields=("_id",)):
+    # One round trip for every update/delete target; returns {_id: document}
+    if not ids:
+        return {}
+    projection = {field: 1 for field in fields}
+    return {doc["_id"]: doc for doc in collection.find({"_id": {"$in": list(ids)}}, projection)}
+
+def execute(collection, requests, positions, results):
+    # requests are pymongo write models; positions[i] is the caller's index for requests[i].
+    # results must already hold the success result for every queued request.
+    if not requests:
+        return
+    try:
+        collection.bulk_write(requests, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            index = positions[error["index"]]
+            status = 409 if error.get("code") == 11000 else 400
+            results[index] = item_result(index, status, error=error.get("errmsg"))
+
+def summary(results):
+    failed = sum(1 for result in results if result["status"] >= 400)
+    body = {"results": results, "succeeded": len(results) - failed, "failed": failed}
+    # 207 Multi-Status when only some of the operations went through
+    return body, 207 if failed else 200
@@ -0,0 +1,151 @@
+import logging
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid, PyMongoError
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_COLLECTION = "cache_invalidations"
+_MISSING = object()
+
+class TTLCache:
+    # Bounded LRU map whose entries also expire after ttl seconds. Every worker process
+    # has its own copy, so the TTL bounds how stale another worker's entry can get.
+    def __init__(self, name, maxsize, ttl):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and entry[1] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not _MISSING:
+                del self._data[key]
+            self.misses += 1
+            return default
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader):
+        # Misses (None) are not cached so a document created elsewhere shows up at once
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+_caches = {}
+_channel = None
+
+def get_cache(name, ttl=None):
+    # ttl overrides CACHE_TTL; it only takes effect on the call that creates the cache
+    if name not in _caches:
+        config = get_config()
+        _caches[name] = TTLCache(name, config["CACHE_MAX_ENTRIES"], ttl or config["CACHE_TTL"])
+    return _caches[name]
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+def _origin():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def invalidate(name, key=None):
+    # Drops the entry (or the whole cache when key is None) here and, when the
+    # invalidation channel is running, in every other worker
+    key = str(key) if key is not None else None
+    get_cache(name).invalidate(key)
+    if _channel is not None:
+        try:
+            _channel.insert_one({"cache": name, "key": key, "origin": _origin(), "at": datetime.utcnow()})
+        except PyMongoError as e:
+            logger.warning("Could not publish cache invalidation for %s: %s", name, e)
+
+def connect_invalidation_channel(db):
+    # Publish invalidations without listening, for commands that change data workers cache
+    global _channel
+    try:
+        db.create_collection(INVALIDATION_COLLECTION, capped=True, size=1024 * 1024)
+    except CollectionInvalid:
+        pass
+    _channel = db.get_collection(INVALIDATION_COLLECTION)
+
+def start_invalidation_listener(db):
+    # Workers share invalidations through a capped collection that each one tails
+    connect_invalidation_channel(db)
+    thread = threading.Thread(target=_listen, name="cache-invalidation", daemon=True)
+    thread.start()
+    return thread
+
+def _listen():
+    # Tails the capped collection in insertion ($natural) order and keeps the cursor open.
+    # ObjectIds from different processes are not ordered, so when the cursor has to be
+    # reopened it reads from the start and skips up to the last message seen, matched by
+    # identity. If that message has already been pushed out of the capped collection, some
+    # after it may have gone too, so every local cache is cleared instead.
+    latest = _channel.find_one(sort=[("$natural", -1)])
+    last_id = latest["_id"] if latest else None
+    while True:
+        try:
+            cursor = _channel.find({}, cursor_type=CursorType.TAILABLE_AWAIT, sort=[("$natural", 1)])
+            skipping = last_id is not None
+            while cursor.alive:
+                for message in cursor:
+                    if skipping:
+                        skipping = message["_id"] != last_id
+                        continue
+                    last_id = message["_id"]
+                    if message["origin"] != _origin():
+                        get_cache(message["cache"]).invalidate(message["key"])
+                if skipping:
+                    logger.warning("Cache invalidations may have been missed; clearing local caches")
+                    for cache in list(_caches.values()):
+                        cache.invalidate()
+                    skipping = False
+        except PyMongoError as e:
+            logger.warning("Cache invalidation listener error: %s", e)
+        # A tailable cursor on an empty collection dies straight away
+        time.sleep(1)
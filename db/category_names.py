@@ -0,0 +1,99 @@
+import sys
+from datetime import datetime
+from db.cache import get_cache, invalidate
+from db.denormalize import propagate_category
+from db.indexes import CASE_INSENSITIVE
+from db.slugs import slugify
+
+# Every category keyed by its case-folded name, and again by its slug, loaded with one query.
+# Writes to categories call invalidate(CATEGORY_NAMES), which also reaches other workers when
+# the invalidation channel runs; otherwise the map is reloaded after CACHE_TTL.
+CATEGORY_NAMES = "category_names"
+
+def name_key(name):
+    return name.casefold()
+
+def name_map(categories):
+    # Categories the backfill (migration 4) has not reached yet are keyed by their name slugified
+    names, slugs = {}, {}
+    for category in categories:
+        if category.get("name"):
+            names[name_key(category["name"])] = category
+            slugs[category.get("slug") or slugify(category["name"])] = category
+    return {"names": names, "slugs": slugs}
+
+def find_category(names, name):
+    # An exact name wins; the slug only answers when no name matches. "Home Garden" and
+    # "Home & Garden" share a base slug, so slugifying first would mix them up.
+    return names["names"].get(name_key(name)) or names["slugs"].get(slugify(name))
+
+def category_names(db):
+    return get_cache(CATEGORY_NAMES).get_or_load(
+        "all", lambda: name_map(db.get_collection("categories").find()))
+
+def lookup_query(name):
+    # Queries for a name the map does not know: by name_ci (with its collation), then by slug
+    return [({"name": name}, CASE_INSENSITIVE), ({"slug": slugify(name)}, None)]
+
+def category_by_name(db, name):
+    # The cached document is shared; callers copy it before changing it
+    category = find_category(category_names(db), name)
+    if category is not None:
+        return category
+    # Created since the map was loaded (e.g. by another worker): misses are never served from
+    # the map alone, and a hit means the map is stale, so it is reloaded
+    categories = db.get_collection("categories")
+    for query, collation in lookup_query(name):
+        category = categories.find_one(query, collation=collation)
+        if category is not None:
+            get_cache(CATEGORY_NAMES).invalidate("all")
+            return find_category(category_names(db), name) or category
+    return None
+
+def duplicate_names(db):
+    # Categories whose names differ only in case, which keep name_ci from being built;
+    # one list per name, oldest first
+    groups = {}
+    for category in db.get_collection("categories").find({}, {"name": 1, "image": 1}).sort("_id", 1):
+        if category.get("name"):
+            groups.setdefault(name_key(category["name"]), []).append(category)
+    return [group for group in groups.values() if len(group) > 1]
+
+def merge_duplicates(db):
+    # The oldest category of each name is kept. The others' products move to it, with their
+    # category copy refreshed, and the others are deleted. Returns (categories removed, products moved).
+    removed = moved = 0
+    categories, products = db.get_collection("categories"), db.get_collection("products")
+    for keep, *others in duplicate_names(db):
+        ids = [category["_id"] for category in others]
+        moved += products.update_many({"categoryId": {"$in": ids}}, {"$set": {"categoryId": keep["_id"], "updatedAt": datetime.now()}}).modified_count
+        propagate_category(db, keep["_id"], keep)
+        removed += categories.delete_many({"_id": {"$in": ids}}).deleted_count
+        for category_id in ids:
+            invalidate("category", str(category_id))
+    if removed:
+        invalidate("categories")
+        invalidate(CATEGORY_NAMES)
+        invalidate("product")
+    return removed, moved
+
+def main(argv):
+    from config import get_config
+    from db.cache import connect_invalidation_channel
+    from db.mongo_client import get_db
+    db = get_db()
+    if "--merge" in argv:
+        if get_config()["CACHE_INVALIDATION_CHANNEL"]:
+            connect_invalidation_channel(db)
+        removed, moved = merge_duplicates(db)
+        print(f"{removed} duplicate categories removed, {moved} products moved")
+        return 0
+    groups = duplicate_names(db)
+    for group in groups:
+        print(", ".join(f"{category['_id']} {category['name']!r}" for category in group))
+    return 1 if groups else 0
+
+if __name__ == "__main__":
+    # python -m db.category_names --duplicates   list categories whose names differ only in case
+    # python -m db.category_names --merge        keep the oldest of each and move the rest's products to it
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,63 @@
+import logging
+import threading
+from contextvars import ContextVar
+from pymongo import monitoring
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+# The route whose handler is running; commands issued outside a request count as "background"
+current_route = ContextVar("current_route", default="background")
+# Per-request tally {"commands": n, "seconds": s}, set by the request middleware
+current_tally = ContextVar("current_tally", default=None)
+
+def documents_returned(command_name, reply):
+    cursor = reply.get("cursor")
+    if cursor:
+        return len(cursor.get("firstBatch", cursor.get("nextBatch", [])))
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") else 0
+    return 0
+
+class CommandStats(monitoring.CommandListener):
+    # Command count, time and documents returned per (route, command), plus slow command logging
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.commands = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        self._pending[(event.connection_id, event.request_id)] = (
+            current_route.get(), current_tally.get(), collection if isinstance(collection, str) else None
+        )
+
+    def _finish(self, event, failed):
+        route, tally, collection = self._pending.pop((event.connection_id, event.request_id), ("background", None, None))
+        seconds = event.duration_micros / 1e6
+        documents = 0 if failed else documents_returned(event.command_name, event.reply)
+        with self._lock:
+            stats = self.commands.setdefault((route, event.command_name), {"count": 0, "failures": 0, "seconds": 0.0, "documents": 0})
+            stats["count"] += 1
+            stats["failures"] += failed
+            stats["seconds"] += seconds
+            stats["documents"] += documents
+        if tally is not None:
+            tally["commands"] += 1
+            tally["seconds"] += seconds
+        slow_ms = get_config()["SLOW_QUERY_MS"]
+        if slow_ms and seconds * 1000 >= slow_ms:
+            logger.warning("Slow Mongo %s on %s.%s: %.1fms, %d documents (route %s)",
+                           event.command_name, event.database_name, collection, seconds * 1000, documents, route)
+
+    def succeeded(self, event):
+        self._finish(event, False)
+
+    def failed(self, event):
+        self._finish(event, True)
+
+    def snapshot(self):
+        with self._lock:
+            return {key: dict(stats) for key, stats in self.commands.items()}
+
+command_stats = CommandStats()
@@ -0,0 +1,57 @@
+import sys
+from datetime import datetime
+
+# Products carry a copy of their category's name and image so reads never join to categories.
+# Every write that changes a category or a product's categoryId refreshes the copy.
+
+def category_copy(category):
+    if not category:
+        return {"categoryName": None, "categoryImage": None}
+    return {"categoryName": category.get("name"), "categoryImage": category.get("image")}
+
+def category_copy_for(db, category_id):
+    # Read from categories, not the per-worker cache: a copy written from a stale cache entry
+    # would outlive the rename that already fanned out to the other products
+    if not category_id:
+        return category_copy(None)
+    return category_copy(db.get_collection("categories").find_one({"_id": category_id}, {"name": 1, "image": 1}))
+
+def category_copies(db, category_ids):
+    # {categoryId: copy} for several products with one $in lookup; unknown ids are left out
+    ids = list({category_id for category_id in category_ids if category_id})
+    if not ids:
+        return {}
+    categories = db.get_collection("categories").find({"_id": {"$in": ids}}, {"name": 1, "image": 1})
+    return {category["_id"]: category_copy(category) for category in categories}
+
+def propagate_category(db, category_id, category):
+    # One update_many over the category's products, skipping those already up to date.
+    # updatedAt moves so cached copies and client validators see the change.
+    copy = category_copy(category)
+    result = db.get_collection("products").update_many(
+        {"categoryId": category_id, "$or": [{field: {"$ne": value}} for field, value in copy.items()]},
+        {"$set": {**copy, "updatedAt": datetime.now()}},
+    )
+    return result.modified_count
+
+def repair_product_categories(db):
+    # Rewrites the copy on every product that disagrees with its category; returns the number changed
+    modified, known = 0, []
+    for category in db.get_collection("categories").find({}, {"name": 1, "image": 1}):
+        modified += propagate_category(db, category["_id"], category)
+        known.append(category["_id"])
+    # Products without a category, or pointing at one that no longer exists
+    modified += db.get_collection("products").update_many(
+        {"categoryId": {"$nin": known}, "$or": [{"categoryName": {"$ne": None}}, {"categoryImage": {"$ne": None}}]},
+        {"$set": {**category_copy(None), "updatedAt": datetime.now()}},
+    ).modified_count
+    return modified
+
+def main(argv):
+    from db.mongo_client import get_db
+    print(f"{repair_product_categories(get_db())} products updated")
+    return 0
+
+if __name__ == "__main__":
+    # python -m db.denormalize   rewrite stale category names/images on products
+    sys.exit(main(sys.argv[1:]))
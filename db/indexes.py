@@ -0,0 +1,191 @@
+import logging
+import sys
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, TEXT
+from pymongo.collation import Collation
+from pymongo.errors import OperationFailure
+from db.search import search_query
+
+logger = logging.getLogger(__name__)
+
+# Case-insensitive comparison; queries must pass the same collation to use the index
+CASE_INSENSITIVE = Collation(locale="en", strength=2)
+# An index with this name already exists with other keys or options
+INDEX_CONFLICT_CODES = (85, 86)
+# Existing documents break a unique index
+DUPLICATE_KEY = 11000
+
+INDEXES = {
+    "blogs": [
+        {"keys": [("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], "name": "status_created_at"},
+        {"keys": [("author", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], "name": "author_created_at"},
+        {"keys": [("created_at", DESCENDING), ("_id", DESCENDING)], "name": "created_at"},
+        {"keys": [("title", ASCENDING)], "name": "title"},
+        # Unique once set; posts without one yet are left out until migration 3 backfills them
+        {"keys": [("slug", ASCENDING)], "name": "slug", "unique": True, "partialFilterExpression": {"slug": {"$exists": True}}},
+        {"keys": [("title", TEXT), ("content", TEXT)], "name": "title_content_text", "weights": {"title": 10, "content": 1}},
+    ],
+    "categories": [
+        {"keys": [("name", ASCENDING)], "name": "name"},
+        # Category names are unique regardless of case
+        {"keys": [("name", ASCENDING)], "name": "name_ci", "collation": CASE_INSENSITIVE, "unique": True},
+        {"keys": [("slug", ASCENDING)], "name": "slug", "unique": True, "partialFilterExpression": {"slug": {"$exists": True}}},
+        {"keys": [("created_at", DESCENDING), ("_id", DESCENDING)], "name": "created_at"},
+        {"keys": [("name", TEXT)], "name": "name_text"},
+    ],
+    "products": [
+        {"keys": [("categoryId", ASCENDING), ("createdAt", DESCENDING)], "name": "categoryId_createdAt"},
+        {"keys": [("createdAt", DESCENDING), ("_id", DESCENDING)], "name": "createdAt"},
+        {"keys": [("name", TEXT), ("description", TEXT)], "name": "name_description_text", "weights": {"name": 10, "description": 2}},
+    ],
+    "users": [
+        {"keys": [("username", ASCENDING)], "name": "username", "unique": True},
+    ],
+    "token_blocklist": [
+        # Revoked tokens are dropped by Mongo once they would have expired anyway
+        {"keys": [("expires_at", ASCENDING)], "name": "expires_at_ttl", "expireAfterSeconds": 0},
+        {"keys": [("revoked_at", ASCENDING)], "name": "revoked_at"},
+    ],
+}
+
+def _total(filter):
+    # The aggregation count_documents runs for a page's exact total
+    return [{"$match": filter}, {"$group": {"_id": 1, "n": {"$sum": 1}}}]
+
+# Representative query shapes issued by the routes; check_query_plans explains each one,
+# finds through find().explain() and "pipeline" shapes through an explained aggregate
+QUERY_SHAPES = [
+    {"route": "GET /blogs", "collection": "blogs", "filter": {"status": "published"}, "sort": [("created_at", -1), ("_id", -1)]},
+    {"route": "GET /blogs/user", "collection": "blogs", "filter": {"author": ""}, "sort": [("created_at", -1), ("_id", -1)]},
+    {"route": "GET /blogs/all", "collection": "blogs", "filter": {}, "sort": [("created_at", -1)]},
+    {"route": "GET /blogs/<blog_name>/name", "collection": "blogs", "filter": {"slug": ""}},
+    {"route": "GET /blogs/<blog_name>/name (unslugged)", "collection": "blogs", "filter": {"title": "", "slug": {"$exists": False}}},
+    {"route": "POST /blogs/filter (text)", "collection": "blogs", "filter": {"$text": {"$search": "shape"}}},
+    {"route": "POST /blogs/filter (regex)", "collection": "blogs", "filter": search_query("shape", "regex", ["title", "content"]), "sort": [("created_at", -1), ("_id", -1)]},
+    {"route": "POST /products/filter", "collection": "products", "filter": {}, "sort": [("createdAt", -1), ("_id", -1)]},
+    {"route": "POST /products/filter (text)", "collection": "products", "filter": {"$text": {"$search": "shape"}}},
+    {"route": "POST /products/filter (regex)", "collection": "products", "filter": search_query("shape", "regex", ["name"]), "sort": [("createdAt", -1), ("_id", -1)]},
+    {"route": "GET /products/category/<category_id>", "collection": "products", "filter": {"categoryId": ObjectId()}},
+    {"route": "GET /products/category/<category_name>/name", "collection": "products", "filter": {"categoryId": ObjectId()}, "sort": [("createdAt", -1)]},
+    {"route": "POST /categories/filter", "collection": "categories", "filter": {}, "sort": [("created_at", -1), ("_id", -1)]},
+    {"route": "POST /categories/filter (regex)", "collection": "categories", "filter": search_query("shape", "regex", ["name"]), "sort": [("created_at", -1), ("_id", -1)]},
+    {"route": "GET /blogs (total)", "collection": "blogs", "pipeline": _total({"status": "published"})},
+    {"route": "GET /blogs/user (total)", "collection": "blogs", "pipeline": _total({"author": ""})},
+    {"route": "POST /blogs/filter (regex total)", "collection": "blogs", "pipeline": _total(search_query("shape", "regex", ["title", "content"]))},
+    {"route": "POST /products/filter (total)", "collection": "products", "pipeline": _total({})},
+    {"route": "POST /products/filter (regex total)", "collection": "products", "pipeline": _total(search_query("shape", "regex", ["name"]))},
+    {"route": "POST /categories/filter (regex total)", "collection": "categories", "pipeline": _total(search_query("shape", "regex", ["name"]))},
+    {"route": "POST /login", "collection": "users", "filter": {"username": ""}},
+    {"route": "token blocklist refresh", "collection": "token_blocklist", "filter": {"revoked_at": {"$gte": 0}}},
+]
+
+def create_index(collection, index, options, rebuild=False):
+    # create_index is a no-op when an identical index already exists. One with the same name
+    # but another definition (e.g. it has since become unique) is left alone unless rebuild
+    # is set; then it is dropped and rebuilt, and if the new one cannot be built (duplicates,
+    # say) the old one is put back.
+    try:
+        return collection.create_index(index["keys"], **options)
+    except OperationFailure as e:
+        old = collection.index_information().get(index["name"])
+        if not rebuild or e.code not in INDEX_CONFLICT_CODES or old is None:
+            raise
+    collection.drop_index(index["name"])
+    try:
+        collection.create_index(index["keys"], **options)
+    except OperationFailure:
+        collection.create_index(old["key"], name=index["name"], **{k: v for k, v in old.items() if k not in ("key", "v", "ns")})
+        raise
+    logger.info("Rebuilt index %s.%s", collection.name, index["name"])
+
+def ensure_indexes(db, rebuild=False):
+    # Worker warm-up only creates what is missing; rebuilding a changed index is left to
+    # python -m db.indexes, so workers never race each other on drop_index
+    failures = []
+    for collection_name, indexes in INDEXES.items():
+        collection = db.get_collection(collection_name)
+        for index in indexes:
+            options = {k: v for k, v in index.items() if k != "keys"}
+            try:
+                create_index(collection, index, options, rebuild)
+            except OperationFailure as e:
+                if e.code in INDEX_CONFLICT_CODES and not rebuild:
+                    logger.warning("Index %s.%s exists with another definition; run python -m db.indexes to rebuild it",
+                                   collection_name, index["name"])
+                else:
+                    # e.g. existing duplicates block a unique index; report it and keep going
+                    logger.error("Could not create index %s.%s: %s", collection_name, index["name"], e)
+                failures.append((collection_name, index["name"], e))
+    return failures
+
+def blocked_by_duplicates(failures):
+    # Unique indexes from ensure_indexes failures that existing duplicates keep from being built
+    return [f"{collection_name}.{name}" for collection_name, name, error in failures if error.code == DUPLICATE_KEY]
+
+def missing_indexes(db):
+    # Declared indexes that do not exist, as "collection.name"
+    missing = []
+    for collection_name, indexes in INDEXES.items():
+        existing = db.get_collection(collection_name).index_information()
+        missing += [f"{collection_name}.{index['name']}" for index in indexes if index["name"] not in existing]
+    return missing
+
+def plan_stages(plan):
+    stages = [plan.get("stage")]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += plan_stages(child)
+    return [stage for stage in stages if stage]
+
+def winning_plan(db, shape):
+    if "pipeline" in shape:
+        explained = db.command("aggregate", shape["collection"], pipeline=shape["pipeline"], explain=True)
+        # A pipeline that is not pushed down whole reports its plan under the $cursor stage
+        planner = explained.get("queryPlanner") or explained["stages"][0]["$cursor"]["queryPlanner"]
+        return planner["winningPlan"]
+    cursor = db.get_collection(shape["collection"]).find(shape["filter"])
+    if shape.get("sort"):
+        cursor = cursor.sort(shape["sort"])
+    if shape.get("collation"):
+        cursor = cursor.collation(shape["collation"])
+    return cursor.explain()["queryPlanner"]["winningPlan"]
+
+def check_query_plans(db):
+    report = []
+    for shape in QUERY_SHAPES:
+        stages = plan_stages(winning_plan(db, shape))
+        report.append({
+            "route": shape["route"],
+            "collection": shape["collection"],
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages
+        })
+    return report
+
+def warn_collection_scans(db):
+    for entry in check_query_plans(db):
+        if entry["collscan"]:
+            logger.warning("%s runs a collection scan on %s", entry["route"], entry["collection"])
+
+def main(argv):
+    from db.mongo_client import get_db
+    db = get_db()
+    if "--check" in argv:
+        report = check_query_plans(db)
+        for entry in report:
+            status = "COLLSCAN" if entry["collscan"] else "ok"
+            print(f"{status:8} {entry['route']} [{entry['collection']}] {' <- '.join(entry['stages'])}")
+        return 1 if any(entry["collscan"] for entry in report) else 0
+    failures = ensure_indexes(db, rebuild=True)
+    for collection_name, indexes in INDEXES.items():
+        print(f"{collection_name}: {', '.join(index['name'] for index in indexes)}")
+    for collection_name, name, error in failures:
+        print(f"failed {collection_name}.{name}: {error}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    # python -m db.indexes           create any missing indexes and rebuild changed ones
+    # python -m db.indexes --check   explain each route's query shape and flag collection scans
+    sys.exit(main(sys.argv[1:]))
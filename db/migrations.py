@@ -0,0 +1,201 @@
+import sys
+import logging
+import threading
+from datetime import datetime, timedelta
+from contextlib import contextmanager
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from db.cache import invalidate
+from db.category_names import CATEGORY_NAMES
+from db.denormalize import repair_product_categories
+from db.slugs import backfill_slugs
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = "migrations"
+# A "running" migration whose heartbeat is older than this is assumed to belong to a dead process
+LOCK_TIMEOUT = timedelta(minutes=5)
+# How often a running migration refreshes its heartbeat
+HEARTBEAT_INTERVAL = LOCK_TIMEOUT / 5
+# Read caches holding documents of each collection, cleared once a migration on it is done
+CACHES = {
+    "products": ("product",),
+    "blogs": ("blog",),
+    "categories": ("category", "categories", CATEGORY_NAMES),
+}
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+
+class Migration:
+    # Each migration selects the documents that still need it with `query`, so running it
+    # twice is a no-op, and runs server-side as one pipeline `update` through update_many.
+    # Migrations that are already idempotent on their own give `run(db, report)` instead,
+    # returning the modified count; report(**fields) records progress such as `processed`.
+    def __init__(self, version, name, collection, query=None, update=None, run=None):
+        self.version = version
+        self.name = name
+        self.collection = collection
+        self.query = query
+        self.update = update
+        self.run = run
+
+def _list_from_single(single, plural):
+    # images: [image] and image removed, for documents that still have the old single field
+    needs_it = {"$and": [
+        {"$eq": [{"$type": f"${plural}"}, "missing"]},
+        {"$ne": [{"$type": f"${single}"}, "missing"]},
+    ]}
+    return {
+        plural: {"$cond": [needs_it, [f"${single}"], f"${plural}"]},
+        single: {"$cond": [needs_it, "$$REMOVE", f"${single}"]},
+    }
+
+MIGRATIONS = [
+    Migration(
+        1, "product_image_lists", "products",
+        query={"$or": [
+            {"image": {"$exists": True}, "images": {"$exists": False}},
+            {"imageKey": {"$exists": True}, "imageKeys": {"$exists": False}},
+        ]},
+        update=[{"$set": {**_list_from_single("image", "images"), **_list_from_single("imageKey", "imageKeys")}}],
+    ),
+    # Backfills categoryName/categoryImage; python -m db.denormalize reruns it as a repair
+    Migration(2, "product_category_copies", "products", run=lambda db, report: repair_product_categories(db)),
+    # Unique slugs for by-name lookups, for blogs and categories written before they existed
+    Migration(3, "blog_slugs", "blogs", run=backfill_slugs("blogs", "title")),
+    Migration(4, "category_slugs", "categories", run=backfill_slugs("categories", "name")),
+]
+
+def migration_states(db):
+    states = {state["_id"]: state for state in db.get_collection(MIGRATIONS_COLLECTION).find()}
+    result = []
+    for migration in MIGRATIONS:
+        state = {k: v for k, v in states.get(migration.version, {}).items() if k != "_id"}
+        result.append({"version": migration.version, "name": migration.name, "status": PENDING, **state})
+    return result
+
+def _claim(db, migration):
+    # Mark the migration as running unless it is done or another process holds it
+    migrations = db.get_collection(MIGRATIONS_COLLECTION)
+    now = datetime.utcnow()
+    try:
+        migrations.update_one(
+            {"_id": migration.version},
+            {"$setOnInsert": {"name": migration.name, "status": PENDING, "processed": 0, "modified": 0}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        pass
+    return migrations.find_one_and_update(
+        {"_id": migration.version, "$or": [
+            {"status": {"$in": [PENDING, FAILED]}},
+            {"status": RUNNING, "heartbeat": {"$lt": now - LOCK_TIMEOUT}},
+        ]},
+        {"$set": {"status": RUNNING, "started_at": now, "heartbeat": now, "error": None}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+def _report(db, migration, progress, **fields):
+    fields["heartbeat"] = datetime.utcnow()
+    state = db.get_collection(MIGRATIONS_COLLECTION).find_one_and_update(
+        {"_id": migration.version}, {"$set": fields}, return_document=ReturnDocument.AFTER,
+    )
+    if progress:
+        progress(migration, state)
+    return state
+
+@contextmanager
+def _heartbeat(db, migration):
+    # A single update_many or run() can outlast LOCK_TIMEOUT; keep the claim fresh meanwhile
+    stop = threading.Event()
+    def beat():
+        while not stop.wait(HEARTBEAT_INTERVAL.total_seconds()):
+            try:
+                db.get_collection(MIGRATIONS_COLLECTION).update_one(
+                    {"_id": migration.version, "status": RUNNING}, {"$set": {"heartbeat": datetime.utcnow()}})
+            except PyMongoError as e:
+                logger.warning("Could not refresh heartbeat of migration %s: %s", migration.version, e)
+    thread = threading.Thread(target=beat, name=f"migration-{migration.version}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+def run_migration(db, migration, progress=None):
+    # Returns the final state, or None when the migration is done or running elsewhere
+    if _claim(db, migration) is None:
+        return None
+    collection = db.get_collection(migration.collection)
+    try:
+        with _heartbeat(db, migration):
+            if migration.run is not None:
+                modified = migration.run(db, lambda **fields: _report(db, migration, progress, **fields))
+                fields = {"modified": modified}
+            else:
+                _report(db, migration, progress, total=collection.count_documents(migration.query))
+                result = collection.update_many(migration.query, migration.update)
+                fields = {"processed": result.matched_count, "modified": result.modified_count}
+    except Exception as e:
+        logger.exception("Migration %s (%s) failed", migration.version, migration.name)
+        return _report(db, migration, progress, status=FAILED, error=str(e))
+    for name in CACHES.get(migration.collection, ()):
+        invalidate(name)
+    return _report(db, migration, progress, status=DONE, finished_at=datetime.utcnow(), **fields)
+
+def migrate(db, target=None, progress=None):
+    # Apply every migration up to `target` in version order, stopping at the first failure
+    done = {state["_id"] for state in db.get_collection(MIGRATIONS_COLLECTION).find({"status": DONE}, {"_id": 1})}
+    results = []
+    for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+        if migration.version in done or (target is not None and migration.version > target):
+            continue
+        state = run_migration(db, migration, progress)
+        results.append(state)
+        if state is None or state["status"] != DONE:
+            break
+    return results
+
+_job = None
+_job_lock = threading.Lock()
+
+def start_migration_job(db, target=None):
+    # Runs migrate() on a background thread; returns False if this process already has one running
+    global _job
+    with _job_lock:
+        if _job is not None and _job.is_alive():
+            return False
+        _job = threading.Thread(target=migrate, args=(db, target), name="migrations", daemon=True)
+        _job.start()
+        return True
+
+def job_running():
+    return _job is not None and _job.is_alive()
+
+def _print_progress(migration, state):
+    total = state.get("total")
+    done = f"{state.get('processed', 0)}/{total}" if total is not None else str(state.get("processed", 0))
+    print(f"{migration.version:>4} {migration.name}: {state['status']} {done} (modified {state.get('modified', 0)})")
+
+def main(argv):
+    from config import get_config
+    from db.cache import connect_invalidation_channel
+    from db.mongo_client import get_db
+    db = get_db()
+    if get_config()["CACHE_INVALIDATION_CHANNEL"]:
+        # Running workers drop what they cached from before the migration
+        connect_invalidation_channel(db)
+    if "--status" in argv:
+        for state in migration_states(db):
+            print(f"{state['version']:>4} {state['name']}: {state['status']}")
+        return 0
+    target = int(argv[argv.index("--to") + 1]) if "--to" in argv else None
+    results = migrate(db, target, progress=_print_progress)
+    return 0 if all(state and state["status"] == DONE for state in results) else 1
+
+if __name__ == "__main__":
+    # python -m db.migrations            apply pending migrations
+    # python -m db.migrations --to N     apply pending migrations up to version N
+    # python -m db.migrations --status   list migrations and their state
+    sys.exit(main(sys.argv[1:]))
@@ -1,6 +1,176 @@
-from pymongo import MongoClient
-import os
+import threading
+from pymongo import AsyncMongoClient, MongoClient, monitoring
+from config import get_config
+from db.command_stats import command_stats
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    # Counts connection pool activity across every server the client talks to
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.waiting = 0
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "open": self.open,
+                "checked_out": self.checked_out,
+                "waiting": self.waiting,
+                "checkouts": self.checkouts,
+                "checkout_failures": self.checkout_failures,
+                "wait_time_total_ms": round(self.wait_time_total * 1000, 3),
+                "wait_time_max_ms": round(self.wait_time_max * 1000, 3),
+                "wait_time_avg_ms": round(self.wait_time_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0
+            }
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            self.waiting += 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        # duration covers the whole wait, including establishing a new connection
+        duration = getattr(event, "duration", None) or 0.0
+        with self._lock:
+            self.waiting -= 1
+            self.checked_out += 1
+            self.checkouts += 1
+            self.wait_time_total += duration
+            self.wait_time_max = max(self.wait_time_max, duration)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+pool_stats = PoolStats()
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+# Bumped whenever the clients are dropped, so lazy handles know to rebind
+_generation = 0
+
+def client_options():
+    config = get_config()
+    options = {
+        "maxPoolSize": config["MONGO_MAX_POOL_SIZE"],
+        "minPoolSize": config["MONGO_MIN_POOL_SIZE"],
+        "maxIdleTimeMS": config["MONGO_MAX_IDLE_TIME_MS"],
+        "waitQueueTimeoutMS": config["MONGO_WAIT_QUEUE_TIMEOUT_MS"],
+        "connectTimeoutMS": config["MONGO_CONNECT_TIMEOUT_MS"],
+        "serverSelectionTimeoutMS": config["MONGO_SERVER_SELECTION_TIMEOUT_MS"],
+        "socketTimeoutMS": config["MONGO_SOCKET_TIMEOUT_MS"],
+        "compressors": config["MONGO_COMPRESSORS"],
+        "readPreference": config["MONGO_READ_PREFERENCE"],
+        "readConcernLevel": config["MONGO_READ_CONCERN"],
+        "w": int(config["MONGO_WRITE_CONCERN"]) if (config["MONGO_WRITE_CONCERN"] or "").isdigit() else config["MONGO_WRITE_CONCERN"],
+        "appname": config["MONGO_APP_NAME"],
+    }
+    # Unset options fall back to the driver (or connection string) defaults
+    return {k: v for k, v in options.items() if v is not None}
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MongoClient(get_config()["MONGO_URI"], event_listeners=[pool_stats, command_stats], **client_options())
+    return _client
 
 def get_db():
-    client = MongoClient(os.getenv("MONGO_URI"))
-    return client.get_database(os.getenv("DB_NAME")) 
\ No newline at end of file
+    return get_client().get_database(get_config()["DB_NAME"])
+
+def reset_client():
+    # In a forked child: forget the clients inherited from the parent (their sockets and
+    # monitor threads belong to it) so this process opens its own on first use
+    global _client, _async_client, _client_lock, _generation
+    _client = None
+    _async_client = None
+    _client_lock = threading.Lock()
+    _generation += 1
+
+def close_client():
+    # Closes this process's sync client, e.g. in the gunicorn master before it forks
+    if _client is not None:
+        _client.close()
+    reset_client()
+
+class LazyCollection:
+    # Collection handle for module globals: binds to the current client on use, and again
+    # after reset_client(), so importing a module never connects and forking is safe
+    def __init__(self, name):
+        self._name = name
+        self._bound = (None, None)
+
+    def _collection(self):
+        generation, collection = self._bound
+        if collection is None or generation != _generation:
+            collection = get_db().get_collection(self._name)
+            self._bound = (_generation, collection)
+        return collection
+
+    def __getattr__(self, attr):
+        return getattr(self._collection(), attr)
+
+    def __getitem__(self, name):
+        return self._collection()[name]
+
+class LazyDatabase:
+    # Stands in for get_db() at import time; every use goes to the current client
+    def get_collection(self, name):
+        return LazyCollection(name)
+
+    def __getattr__(self, attr):
+        return getattr(get_db(), attr)
+
+    def __getitem__(self, name):
+        return get_db()[name]
+
+_lazy_db = LazyDatabase()
+
+def lazy_db():
+    return _lazy_db
+
+def get_async_client():
+    # Used by the ASGI entry point (server/asgi.py); shares the pool settings and stats
+    global _async_client
+    if _async_client is None:
+        with _client_lock:
+            if _async_client is None:
+                _async_client = AsyncMongoClient(get_config()["MONGO_URI"], event_listeners=[pool_stats, command_stats], **client_options())
+    return _async_client
+
+def get_async_db():
+    return get_async_client().get_database(get_config()["DB_NAME"])
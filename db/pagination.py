@@ -0,0 +1,128 @@
+import base64
+import json
+from datetime import datetime
+from bson import ObjectId
+from db.cache import get_cache
+
+# include_total modes: exact count, cached/estimated count, or none
+TOTAL_EXACT = "true"
+TOTAL_ESTIMATE = "estimate"
+TOTAL_NONE = "false"
+COUNT_CACHE_TTL = 60
+# Estimated totals per (collection, filter); bounded and expiring like the other caches
+COUNTS = "counts"
+
+def parse_include_total(value):
+    if value is None or value is True:
+        return TOTAL_EXACT
+    if value is False:
+        return TOTAL_NONE
+    value = str(value).lower()
+    if value in ("true", "1"):
+        return TOTAL_EXACT
+    if value in ("false", "0"):
+        return TOTAL_NONE
+    if value == TOTAL_ESTIMATE:
+        return TOTAL_ESTIMATE
+    raise ValueError("include_total must be true, false or estimate")
+
+def encode_cursor(doc, sort_field):
+    value = doc.get(sort_field)
+    payload = {"v": value.isoformat() if value else None, "id": str(doc["_id"])}
+    # Padding is stripped so the cursor can go into a query string as is
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        value = datetime.fromisoformat(payload["v"]) if payload["v"] else None
+        return value, ObjectId(payload["id"])
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def keyset_seek(sort_field, cursor):
+    # Seek past the last (sort_field, _id) pair instead of skipping documents
+    value, last_id = decode_cursor(cursor)
+    if value is None:
+        return {sort_field: None, "_id": {"$lt": last_id}}
+    return {"$or": [
+        {sort_field: {"$lt": value}},
+        {sort_field: value, "_id": {"$lt": last_id}},
+        # Documents without the field sort after every dated one
+        {sort_field: None}
+    ]}
+
+def _count_key(collection, query):
+    return (collection.full_name, repr(query))
+
+def estimated_total(collection, query):
+    # An empty filter is answered from collection metadata; anything else is counted
+    # once and reused for COUNT_CACHE_TTL seconds
+    if not query:
+        return collection.estimated_document_count()
+    return get_cache(COUNTS, COUNT_CACHE_TTL).get_or_load(
+        _count_key(collection, query), lambda: collection.count_documents(query))
+
+async def estimated_total_async(collection, query):
+    if not query:
+        return await collection.estimated_document_count()
+    counts = get_cache(COUNTS, COUNT_CACHE_TTL)
+    key = _count_key(collection, query)
+    total = counts.get(key)
+    if total is None:
+        total = await collection.count_documents(query)
+        counts.set(key, total)
+    return total
+
+def find_arguments(query, sort, seek=None, projection=None):
+    find_query = {"$and": [query, seek]} if query and seek else (seek or query)
+    find_projection = dict(projection or {})
+    for field, direction in sort:
+        if isinstance(direction, dict):
+            find_projection[field] = direction
+    return find_query, find_projection or None
+
+def fetch_page(collection, query, sort, limit, skip=0, seek=None, include_total=TOTAL_EXACT, projection=None):
+    # The page is an indexed find; one extra document is fetched so callers know whether
+    # another page exists. An exact total is a separate count_documents on the same filter.
+    find_query, find_projection = find_arguments(query, sort, seek, projection)
+    docs = list(collection.find(find_query, find_projection).sort(sort).skip(skip).limit(limit + 1))
+    if include_total == TOTAL_EXACT:
+        total = collection.count_documents(query)
+    else:
+        total = estimated_total(collection, query) if include_total == TOTAL_ESTIMATE else None
+    return docs[:limit], total, len(docs) > limit
+
+async def fetch_page_async(collection, query, sort, limit, skip=0, seek=None, include_total=TOTAL_EXACT, projection=None):
+    # Same as fetch_page, for pymongo's AsyncCollection
+    find_query, find_projection = find_arguments(query, sort, seek, projection)
+    docs = await collection.find(find_query, find_projection).sort(sort).skip(skip).limit(limit + 1).to_list(limit + 1)
+    if include_total == TOTAL_EXACT:
+        total = await collection.count_documents(query)
+    else:
+        total = await estimated_total_async(collection, query) if include_total == TOTAL_ESTIMATE else None
+    return docs[:limit], total, len(docs) > limit
+
+def _keyset_arguments(sort_field, cursor, projection):
+    seek = keyset_seek(sort_field, cursor) if cursor else None
+    if projection is not None:
+        # The next cursor is built from the sort field, so it has to be fetched
+        projection = {**projection, sort_field: 1}
+    return [(sort_field, -1), ("_id", -1)], seek, projection
+
+def keyset_page(collection, query, sort_field, cursor, limit, include_total=TOTAL_EXACT, projection=None):
+    sort, seek, projection = _keyset_arguments(sort_field, cursor, projection)
+    docs, total, has_next = fetch_page(collection, query, sort, limit,
+                                       seek=seek, include_total=include_total, projection=projection)
+    next_cursor = encode_cursor(docs[-1], sort_field) if has_next else None
+    return docs, total, next_cursor
+
+async def keyset_page_async(collection, query, sort_field, cursor, limit, include_total=TOTAL_EXACT, projection=None):
+    sort, seek, projection = _keyset_arguments(sort_field, cursor, projection)
+    docs, total, has_next = await fetch_page_async(collection, query, sort, limit,
+                                                   seek=seek, include_total=include_total, projection=projection)
+    next_cursor = encode_cursor(docs[-1], sort_field) if has_next else None
+    return docs, total, next_cursor
+
+def page_count(total, per_page):
+    return (total + per_page - 1) // per_page if total is not None else None
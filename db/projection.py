@@ -0,0 +1,38 @@
+import re
+
+EXCERPT_LENGTH = 200
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_TAG = re.compile(r"<[^>]+>")
+_SPACE = re.compile(r"\s+")
+
+def make_excerpt(text, length=EXCERPT_LENGTH):
+    # Plain-text preview stored next to the body so list views never need the body itself
+    text = _SPACE.sub(" ", _TAG.sub(" ", text or "")).strip()
+    if len(text) <= length:
+        return text
+    return text[:length].rsplit(" ", 1)[0] + "..."
+
+def excerpt_expression(source_field, length=EXCERPT_LENGTH):
+    # Server-side fallback for documents written before excerpts were stored
+    return {"$ifNull": ["$excerpt", {"$substrCP": [{"$ifNull": [f"${source_field}", ""]}, 0, length]}]}
+
+def parse_fields(fields):
+    # Accepts "a,b,c" (query string) or ["a", "b", "c"] (JSON body)
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    names = [name.strip() for name in fields if name and name.strip()]
+    for name in names:
+        if not _FIELD_NAME.match(name):
+            raise ValueError(f"Invalid field name: {name}")
+    return names
+
+def list_projection(fields=None, view=None, summary=None):
+    # Returns None for full documents, otherwise a Mongo projection that is pushed down to
+    # the query. fields= picks exact fields; view=summary uses the caller's summary projection.
+    if fields:
+        return {name: 1 for name in parse_fields(fields)}
+    if view in (None, "", "full"):
+        return None
+    if view == "summary":
+        return dict(summary)
+    raise ValueError("view must be full or summary")
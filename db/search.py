@@ -0,0 +1,21 @@
+# Keyword search modes shared by the filter endpoints: "regex" (substring match, the
+# original behaviour) and "text" (served by the collection's text index)
+SEARCH_MODES = ("regex", "text")
+
+def search_query(keyword, mode, fields):
+    if not keyword:
+        return {}
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"mode must be one of {', '.join(SEARCH_MODES)}")
+    if mode == "text":
+        return {"$text": {"$search": keyword}}
+    regex = {"$regex": keyword, "$options": "i"}
+    if len(fields) == 1:
+        return {fields[0]: regex}
+    return {"$or": [{field: regex} for field in fields]}
+
+def search_sort(query, sort, recency_field):
+    # Relevance ordering only exists for text queries; everything else is newest first
+    if "$text" in query and sort == "score":
+        return [("score", {"$meta": "textScore"}), (recency_field, -1), ("_id", -1)]
+    return [(recency_field, -1), ("_id", -1)]
@@ -0,0 +1,102 @@
+import re
+import unicodedata
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from db.indexes import DUPLICATE_KEY
+
+# Runs of anything but letters and digits (underscores included) become a single hyphen
+_SEPARATORS = re.compile(r"[\W_]+")
+# Slugs tried before a duplicate key error is passed on to the caller
+MAX_ATTEMPTS = 5
+# Documents the slug backfill reads and writes per round trip
+BACKFILL_BATCH_SIZE = 1000
+
+def slugify(text, fallback="untitled"):
+    # "Wi-Fi Tips & Tricks" -> "wi-fi-tips-tricks", "Crème brûlée" -> "creme-brulee";
+    # letters outside latin scripts are kept as they are
+    text = unicodedata.normalize("NFKD", text or "")
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _SEPARATORS.sub("-", text.casefold()).strip("-") or fallback
+
+def _numbered(base):
+    return {"$regex": f"^{re.escape(base)}-[0-9]+$"}
+
+def next_slug(collection, base):
+    # base-N, one above the highest N already taken (base-2 when there is none)
+    taken = [int(doc["slug"].rsplit("-", 1)[1]) for doc in collection.find({"slug": _numbered(base)}, {"slug": 1})]
+    return f"{base}-{max(taken, default=1) + 1}"
+
+def is_slug_conflict(error):
+    # Errors without details (e.g. from mongomock) are taken to be about the slug
+    key_pattern = (error.details or {}).get("keyPattern")
+    return key_pattern is None or "slug" in key_pattern
+
+def write_with_slug(collection, base, write, doc_id=None):
+    # Calls write(slug) with the bare slug first and, while another document holds it, with
+    # the next free base-N. An update (doc_id) keeps a base-N slug the document already has.
+    slug = base
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return write(slug)
+        except DuplicateKeyError as e:
+            if not is_slug_conflict(e) or attempt == MAX_ATTEMPTS - 1:
+                raise
+        current = collection.find_one({"_id": doc_id, "slug": _numbered(base)}, {"slug": 1}) if doc_id else None
+        slug = current["slug"] if current else next_slug(collection, base)
+
+def batch_slugs(collection, bases):
+    # Slugs for several documents written together: one lookup for the bare slugs, and the
+    # next free base-N for any taken already or repeated within the batch
+    taken = {doc["slug"] for doc in collection.find({"slug": {"$in": list(set(bases))}}, {"slug": 1})}
+    slugs, counters = [], {}
+    for base in bases:
+        slug = base
+        if slug in taken:
+            n = counters.get(base) or int(next_slug(collection, base).rsplit("-", 1)[1]) - 1
+            while slug in taken:
+                n += 1
+                slug = f"{base}-{n}"
+            counters[base] = n
+        taken.add(slug)
+        slugs.append(slug)
+    return slugs
+
+def keeps_slug(current, base):
+    # Whether a document's current slug still fits its (possibly unchanged) title or name
+    return bool(current) and (current == base or re.fullmatch(f"{re.escape(base)}-[0-9]+", current) is not None)
+
+def backfill_slugs(collection_name, source_field):
+    # Migration step: gives every document without a slug one made from source_field. Works
+    # through _id order a batch at a time, with one batch_slugs lookup and one unordered
+    # bulk_write per batch, and reports progress after each.
+    def run(db, report):
+        collection = db.get_collection(collection_name)
+        pending = {"slug": {"$exists": False}}
+        report(total=collection.count_documents(pending), processed=0)
+        processed = modified = 0
+        last = None
+        while True:
+            query = pending if last is None else {**pending, "_id": {"$gt": last}}
+            docs = list(collection.find(query, {source_field: 1}).sort("_id", 1).limit(BACKFILL_BATCH_SIZE))
+            if not docs:
+                return modified
+            slugs = batch_slugs(collection, [slugify(doc.get(source_field)) for doc in docs])
+            try:
+                modified += collection.bulk_write([
+                    UpdateOne({"_id": doc["_id"], **pending}, {"$set": {"slug": slug}})
+                    for doc, slug in zip(docs, slugs)
+                ], ordered=False).modified_count
+            except BulkWriteError as e:
+                # A slug taken since batch_slugs looked (e.g. by a create): those documents
+                # are retried one at a time, the rest of the batch is already written
+                modified += e.details["nModified"]
+                for error in e.details["writeErrors"]:
+                    if error["code"] != DUPLICATE_KEY or "slug" not in error.get("keyPattern", {"slug": 1}):
+                        raise
+                    doc = docs[error["index"]]
+                    modified += write_with_slug(collection, slugify(doc.get(source_field)), lambda slug: collection.update_one(
+                        {"_id": doc["_id"], **pending}, {"$set": {"slug": slug}}), doc["_id"]).modified_count
+            processed += len(docs)
+            last = docs[-1]["_id"]
+            report(processed=processed, modified=modified)
+    return run
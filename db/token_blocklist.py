@@ -0,0 +1,65 @@
+import time
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from db.mongo_client import get_db
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+BLOCKLIST_COLLECTION = "token_blocklist"
+# Re-read a little before the last revocation seen, in case another worker's clock runs behind
+OVERLAP = timedelta(seconds=5)
+
+_revoked = {}  # jti -> expiry as a unix timestamp
+_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_last_seen = None
+_next_refresh = 0.0
+
+def _collection():
+    return get_db().get_collection(BLOCKLIST_COLLECTION)
+
+def revoke(jti, exp):
+    # exp is the token's own expiry; the TTL index removes the entry after that
+    now = datetime.now(timezone.utc)
+    with _lock:
+        _revoked[jti] = exp
+    try:
+        _collection().insert_one({"_id": jti, "expires_at": datetime.fromtimestamp(exp, timezone.utc), "revoked_at": now})
+    except DuplicateKeyError:
+        pass
+
+def _refresh():
+    # Pull revocations made since the last refresh and drop entries that have expired
+    global _last_seen
+    query = {"revoked_at": {"$gte": _last_seen - OVERLAP}} if _last_seen else {}
+    entries = list(_collection().find(query, {"expires_at": 1, "revoked_at": 1}))
+    now = time.time()
+    with _lock:
+        for entry in entries:
+            expires_at = entry["expires_at"]
+            if expires_at.tzinfo is None:
+                expires_at = expires_at.replace(tzinfo=timezone.utc)
+            _revoked[entry["_id"]] = expires_at.timestamp()
+            revoked_at = entry["revoked_at"].replace(tzinfo=None)
+            if _last_seen is None or revoked_at > _last_seen:
+                _last_seen = revoked_at
+        for jti in [jti for jti, exp in _revoked.items() if exp < now]:
+            del _revoked[jti]
+
+def is_revoked(jti):
+    # Served from memory; at most one request per refresh interval reads from Mongo
+    global _next_refresh
+    now = time.monotonic()
+    if now >= _next_refresh and _refresh_lock.acquire(blocking=False):
+        try:
+            if now >= _next_refresh:
+                _refresh()
+                _next_refresh = now + get_config()["TOKEN_BLOCKLIST_REFRESH"]
+        except PyMongoError as e:
+            logger.warning("Could not refresh the token blocklist: %s", e)
+        finally:
+            _refresh_lock.release()
+    return jti in _revoked
@@ -0,0 +1,49 @@
+import os
+import tempfile
+
+# gunicorn -c gunicorn.conf.py
+#
+# The app is imported once in the master (preload_app) and the workers fork from it, sharing
+# the imported code. Mongo clients and threads must not cross a fork: the master
+# closes its client before forking and each worker opens its own on first use.
+
+# Warm-up and background threads would otherwise start in the master, where nothing serves requests
+os.environ["START_BACKGROUND_TASKS"] = "false"
+# Workers share their metrics through files here, so /metrics reports every worker's totals
+os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="cdc-metrics-"))
+
+from config import get_config
+
+# gunicorn reads every top-level name here as a setting ("config" is one), hence the underscore
+_config = get_config()
+
+wsgi_app = "server.app:app"
+preload_app = True
+bind = _config["WEB_BIND"]
+workers = _config["WEB_WORKERS"]
+threads = _config["WEB_THREADS"]
+max_requests = _config["WEB_MAX_REQUESTS"]
+max_requests_jitter = _config["WEB_MAX_REQUESTS_JITTER"]
+timeout = _config["WEB_TIMEOUT"]
+graceful_timeout = _config["WEB_GRACEFUL_TIMEOUT"]
+
+def on_starting(server):
+    from server.worker_metrics import clear
+    clear(_config["METRICS_DIR"])
+
+def when_ready(server):
+    # Runs in the master after the app is loaded, before any worker is forked
+    from db.mongo_client import close_client
+    close_client()
+
+def post_fork(server, worker):
+    from db.mongo_client import reset_client
+    from server.app import start_background_tasks
+    reset_client()
+    start_background_tasks()
+
+def worker_exit(server, worker):
+    from db.mongo_client import close_client
+    from server.app import flush_metrics
+    flush_metrics()
+    close_client()
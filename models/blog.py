@@ -1,9 +1,14 @@
+from functools import lru_cache
 from marshmallow import Schema, fields, validate
+from db.projection import excerpt_expression
+from models.dumper import Dumper
 
 class BlogSchema(Schema):
     _id = fields.Str(dump_only=True)
     title = fields.Str(required=True, validate=validate.Length(min=1, max=200))
+    slug = fields.Str(dump_only=True)
     content = fields.Str(required=True)
+    excerpt = fields.Str(dump_only=True)
     image = fields.Str(required=True)
     imageKey = fields.Str(required=True)
     author = fields.Str(required=True)
@@ -12,4 +17,30 @@ class BlogSchema(Schema):
     status = fields.Str(validate=validate.OneOf(['draft', 'published']), default='draft')
 
 blog_schema = BlogSchema()
-blogs_schema = BlogSchema(many=True) 
\ No newline at end of file
+blogs_schema = BlogSchema(many=True)
+# Responses are dumped through compiled dumpers; the schemas above are used for validation
+blog_dumper = Dumper(blog_schema)
+blogs_dumper = Dumper(blog_schema, many=True)
+
+# What list views show: no content, just a short excerpt of it
+BLOG_SUMMARY = {
+    "title": 1,
+    "slug": 1,
+    "image": 1,
+    "author": 1,
+    "status": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "excerpt": excerpt_expression("content"),
+}
+
+@lru_cache(maxsize=64)
+def _projected_dumper(only):
+    return Dumper(BlogSchema(only=only), many=True)
+
+def blogs_dumper_for(projection):
+    # Projected documents are dumped with only the projected fields, so
+    # defaults (status) are not filled in for fields that were never fetched
+    if projection is None:
+        return blogs_dumper
+    return _projected_dumper(tuple(sorted(set(projection) | {"_id"})))
@@ -1,15 +1,9 @@
 from datetime import datetime
 
 class Category:
-    # Class-level set to store unique category names
-    _names = set()
-
+    # Names are unique regardless of case; the categories.name_ci unique index enforces it
     def __init__(self, name, image, imageKey):
-        if name in Category._names:
-            raise ValueError(f"Category name '{name}' already exists.")
         self.name = name
-        Category._names.add(name)
-        
         self.image = image
         self.imageKey = imageKey
         self.created_at = datetime.utcnow()
@@ -22,4 +16,4 @@ class Category:
             'imageKey': self.imageKey,
             'created_at': self.created_at,
             'updated_at': self.updated_at
-        } 
\ No newline at end of file
+        } 
@@ -0,0 +1,49 @@
+from marshmallow import fields
+from marshmallow.utils import missing
+
+def _string(value):
+    return value if value.__class__ is str else (None if value is None else str(value))
+
+def _iso_datetime(value):
+    return None if value is None else value.isoformat()
+
+def _fast_converter(field):
+    # Inline equivalents of the common fields' _serialize; None means use the field itself
+    if type(field) in (fields.String, fields.Str):
+        return _string
+    if type(field) is fields.DateTime and field.format in (None, "iso"):
+        return _iso_datetime
+    return None
+
+class Dumper:
+    # Same output as schema.dump(), compiled once into a (key, attribute, converter, default)
+    # plan per field, so dumping a document is a single loop with no per-field dispatch.
+    # Fields without an inline converter fall back to field.serialize().
+    def __init__(self, schema, many=False):
+        self.schema = schema
+        self.many = many
+        self.plan = []
+        for name, field in schema.dump_fields.items():
+            attribute = field.attribute or name
+            self.plan.append((field.data_key or name, attribute, _fast_converter(field), field.dump_default, field))
+
+    def dump_one(self, doc):
+        out = {}
+        for key, attribute, convert, default, field in self.plan:
+            if convert is None:
+                value = field.serialize(attribute, doc)
+                if value is not missing:
+                    out[key] = value
+                continue
+            value = doc.get(attribute, missing)
+            if value is missing:
+                if default is missing:
+                    continue
+                value = default() if callable(default) else default
+            out[key] = convert(value)
+        return out
+
+    def dump(self, obj):
+        if self.many:
+            return [self.dump_one(doc) for doc in obj]
+        return self.dump_one(obj)
@@ -0,0 +1,125 @@
+import time
+import threading
+import multiprocessing
+import logging
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from werkzeug.security import generate_password_hash, check_password_hash
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+class HashPoolBusy(Exception):
+    pass
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = None
+_stats_lock = threading.Lock()
+_stats = {"hashes": 0, "verifications": 0, "rejected": 0, "broken": 0, "in_flight": 0, "peak_in_flight": 0,
+          "total_seconds": 0.0, "max_seconds": 0.0}
+
+def _new_executor(workers):
+    # Forking a threaded server (Mongo monitor threads, locks held mid-request) is
+    # unsafe; hash workers start from a clean forkserver process instead
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("forkserver"))
+
+def _pool():
+    global _executor, _slots
+    with _executor_lock:
+        if _slots is None:
+            config = get_config()
+            _slots = threading.BoundedSemaphore(max(config["PASSWORD_HASH_WORKERS"], 1) + config["PASSWORD_HASH_QUEUE"])
+            if config["PASSWORD_HASH_WORKERS"] > 0:
+                _executor = _new_executor(config["PASSWORD_HASH_WORKERS"])
+        return _executor, _slots
+
+def _replace(broken):
+    # A worker that died (OOM kill, segfault) breaks the whole pool for good; start a new one.
+    # Only the first request to notice replaces it, the others already see the new pool.
+    global _executor
+    with _executor_lock:
+        if _executor is not broken:
+            return
+        logger.error("Password hash pool broken; starting a new one")
+        _executor = _new_executor(get_config()["PASSWORD_HASH_WORKERS"])
+        with _stats_lock:
+            _stats["broken"] += 1
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def _release(slots):
+    slots.release()
+    with _stats_lock:
+        _stats["in_flight"] -= 1
+
+def _run(kind, fn, *args):
+    # KDFs hold the GIL, so they run in worker processes; a full queue fails fast instead of
+    # piling request threads up behind it
+    executor, slots = _pool()
+    if not slots.acquire(blocking=False):
+        with _stats_lock:
+            _stats["rejected"] += 1
+        raise HashPoolBusy()
+    with _stats_lock:
+        _stats["in_flight"] += 1
+        _stats["peak_in_flight"] = max(_stats["peak_in_flight"], _stats["in_flight"])
+    start = time.perf_counter()
+    try:
+        if executor is None:
+            try:
+                return fn(*args)
+            finally:
+                _release(slots)
+        # The slot is held until the pool is done with the job, not just until this request
+        # stops waiting, so timed-out work still counts against the bound
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool:
+            _release(slots)
+            _replace(executor)
+            raise HashPoolBusy()
+        except BaseException:
+            _release(slots)
+            raise
+        future.add_done_callback(lambda _: _release(slots))
+        try:
+            return future.result(timeout=get_config()["PASSWORD_HASH_TIMEOUT"])
+        except TimeoutError:
+            # Drops the job if it is still queued; one already running finishes on its own
+            future.cancel()
+            raise HashPoolBusy()
+        except BrokenProcessPool:
+            # This request gets a 503 and the next one a fresh pool
+            _replace(executor)
+            raise HashPoolBusy()
+    finally:
+        elapsed = time.perf_counter() - start
+        with _stats_lock:
+            _stats[kind] += 1
+            _stats["total_seconds"] += elapsed
+            _stats["max_seconds"] = max(_stats["max_seconds"], elapsed)
+
+def hash_password(password):
+    return _run("hashes", generate_password_hash, password, get_config()["PASSWORD_HASH_METHOD"])
+
+def verify_password(hashed_password, password):
+    return _run("verifications", check_password_hash, hashed_password, password)
+
+@lru_cache(maxsize=8)
+def _method_prefix(method):
+    # werkzeug fills in default cost parameters, so read the canonical prefix off a real hash
+    return generate_password_hash("", method).split("$", 1)[0]
+
+def needs_rehash(hashed_password):
+    return hashed_password.split("$", 1)[0] != _method_prefix(get_config()["PASSWORD_HASH_METHOD"])
+
+def password_stats():
+    config = get_config()
+    with _stats_lock:
+        stats = dict(_stats)
+    count = stats["hashes"] + stats["verifications"]
+    stats["avg_seconds"] = stats["total_seconds"] / count if count else 0.0
+    stats["workers"] = config["PASSWORD_HASH_WORKERS"]
+    stats["capacity"] = max(config["PASSWORD_HASH_WORKERS"], 1) + config["PASSWORD_HASH_QUEUE"]
+    return stats
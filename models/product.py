@@ -1,4 +1,5 @@
 from marshmallow import Schema, fields, validate, ValidationError
+from db.projection import excerpt_expression
 
 class ProductSchema(Schema):
     name = fields.Str(required=True, validate=validate.Length(min=1))
@@ -11,4 +12,16 @@ class ProductSchema(Schema):
     categoryId = fields.Str(required=False)
     createdAt = fields.DateTime(required=False)
     updatedAt = fields.DateTime(required=False)
-product_schema = ProductSchema() 
\ No newline at end of file
+product_schema = ProductSchema() 
+
+# What list views show: no content, and a short excerpt instead of the full description
+PRODUCT_SUMMARY = {
+    "name": 1,
+    "images": 1,
+    "price": 1,
+    "currency": 1,
+    "categoryId": 1,
+    "createdAt": 1,
+    "updatedAt": 1,
+    "excerpt": excerpt_expression("description"),
+}
@@ -1,5 +1,5 @@
 from marshmallow import Schema, fields, validate
-from werkzeug.security import generate_password_hash, check_password_hash
+from models.passwords import hash_password, verify_password
 
 class UserSchema(Schema):
     username = fields.Str(required=True, validate=validate.Length(min=1))
@@ -7,9 +7,9 @@ class UserSchema(Schema):
     role = fields.Str(required=True, validate=validate.OneOf(["user", "admin"]))
 
     def hash_password(self, password):
-        return generate_password_hash(password)
+        return hash_password(password)
 
     def verify_password(self, hashed_password, password):
-        return check_password_hash(hashed_password, password)
+        return verify_password(hashed_password, password)
 
 user_schema = UserSchema() 
\ No newline at end of file
@@ -1,14 +1,30 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
-from db.mongo_client import get_db
+from db.mongo_client import lazy_db
 from bson import ObjectId
-from models.blog import blog_schema, blogs_schema
+from models.blog import blog_schema, blogs_schema, blog_dumper, blogs_dumper_for, BLOG_SUMMARY
+from db.pagination import keyset_page, fetch_page, parse_include_total, page_count
+from db.search import search_query, search_sort
+from routes.streaming import stream_format, stream_response, batch_size, chunked
+from routes.conditional import conditional_document, conditional_list
+from db.cache import get_cache, invalidate
+from db.projection import list_projection, make_excerpt
+from db.bulk import parse_operations, operation_error, item_result, fetch_targets, execute, summary
+from db.slugs import slugify, write_with_slug, batch_slugs, keeps_slug
+from pymongo import InsertOne, UpdateOne, DeleteOne, ReturnDocument
 
 blogs_bp = Blueprint('blogs', __name__)
-db = get_db()
+db = lazy_db()
 blogs_collection = db.get_collection('blogs')
 
+RECENT_FIRST = [("created_at", -1), ("_id", -1)]
+
+def requested_projection(params):
+    # fields=title,image or view=summary; raises ValueError for unknown fields
+    projection = list_projection(params.get('fields'), params.get('view'), BLOG_SUMMARY)
+    return projection, blogs_dumper_for(projection)
+
 @blogs_bp.route("/blogs", methods=["POST"])
 @jwt_required()
 def create_blog():
@@ -21,25 +37,43 @@ def create_blog():
     if errors:
         return jsonify({"message": "Validation error", "errors": errors}), 400
     
+    # BSON dates keep milliseconds; truncate so the response matches what a later read returns
+    now = datetime.utcnow()
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
     blog = {
         "title": data['title'],
         "image": data['image'],
         "imageKey": data['imageKey'],
         "content": data['content'],
+        "excerpt": make_excerpt(data['content']),
         "author": current_user,
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow(),
+        "created_at": now,
+        "updated_at": now,
         "status": data.get('status', 'draft')
     }
     
-    result = blogs_collection.insert_one(blog)
-    created_blog = blogs_collection.find_one({"_id": result.inserted_id})
-    return jsonify(blog_schema.dump(created_blog)), 201
+    # insert_one sets blog["_id"], so the stored document can be returned without a re-read
+    def insert(slug):
+        blog["slug"] = slug
+        return blogs_collection.insert_one(blog)
+    write_with_slug(blogs_collection, slugify(blog["title"]), insert)
+    return jsonify(blog_dumper.dump(blog)), 201
 
 @blogs_bp.route("/blogs/all", methods=["GET"])
 def get_all_blogs():
-    blogs = blogs_collection.find().sort("created_at", -1)
-    return jsonify(blogs_schema.dump(blogs)), 200
+    try:
+        projection, dumper = requested_projection(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    fmt = stream_format()
+    if fmt:
+        size = batch_size()
+        cursor = blogs_collection.find({}, projection).sort("created_at", -1).batch_size(size)
+        return stream_response((dumper.dump(chunk) for chunk in chunked(cursor, size)), fmt)
+
+    blogs = blogs_collection.find({}, projection).sort("created_at", -1)
+    return conditional_list(jsonify(dumper.dump(blogs)))
 
 @blogs_bp.route("/blogs", methods=["GET"])
 def get_blogs():
@@ -49,40 +83,70 @@ def get_blogs():
     
     query = {"status": status}
     
-    total = blogs_collection.count_documents(query)
-    blogs = blogs_collection.find(query)\
-        .sort("created_at", -1)\
-        .skip((page - 1) * per_page)\
-        .limit(per_page)
+    try:
+        projection, dumper = requested_projection(request.args)
+        include_total = parse_include_total(request.args.get('include_total'))
+        if 'cursor' in request.args:
+            blogs, total, next_cursor = keyset_page(blogs_collection, query, "created_at", request.args.get('cursor'), per_page, include_total, projection)
+            return conditional_list(jsonify({
+                "blogs": dumper.dump(blogs),
+                "total": total,
+                "per_page": per_page,
+                "next_cursor": next_cursor
+            }))
+        
+        blogs, total, has_next = fetch_page(blogs_collection, query, RECENT_FIRST, per_page,
+                                            skip=(page - 1) * per_page, include_total=include_total, projection=projection)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
     
-    return jsonify({
-        "blogs": blogs_schema.dump(blogs),
+    return conditional_list(jsonify({
+        "blogs": dumper.dump(blogs),
         "total": total,
         "page": page,
         "per_page": per_page,
-        "total_pages": (total + per_page - 1) // per_page
-    }), 200
+        "total_pages": page_count(total, per_page),
+        "has_next": has_next
+    }))
 
 @blogs_bp.route("/blogs/<blog_id>", methods=["GET"])
 def get_blog(blog_id):
     try:
-        blog = blogs_collection.find_one({"_id": ObjectId(blog_id)})
+        response = conditional_document(blogs_collection, {"_id": ObjectId(blog_id)}, "updated_at",
+                                        lambda blog: jsonify(blog_dumper.dump(blog)), cache=get_cache("blog"))
         
-        if not blog:
+        if not response:
             return jsonify({"message": "Blog not found"}), 404
-        return jsonify(blog_schema.dump(blog)), 200
+        return response
     except Exception as e:
         return jsonify({"message": "Invalid blog ID"}), 400
     
 @blogs_bp.route("/blogs/<blog_name>/name", methods=["GET"])
 def get_blog_by_name(blog_name):
-    name = blog_name.replace("-", " ")
-    blog = blogs_collection.find_one({"title": name})
-    if not blog:
+    # Old links ("My-Post") slugify to the same slug as the title they were made from
+    render = lambda blog: jsonify(blog_dumper.dump(blog))
+    response = conditional_document(blogs_collection, {"slug": slugify(blog_name)}, "updated_at", render)
+    if not response:
+        # Posts the slug backfill (migration 3) has not reached yet
+        response = conditional_document(blogs_collection, {"title": blog_name.replace("-", " "), "slug": {"$exists": False}},
+                                        "updated_at", render)
+    if not response:
         return jsonify({"message": "Blog not found"}), 404
-    return jsonify(blog_schema.dump(blog)), 200 
+    return response
 
 
+def update_fields(data):
+    # The fields an update may change; a missing status still means draft
+    update_data = {field: data[field] for field in ("title", "content", "image", "imageKey") if field in data}
+    update_data["status"] = data.get('status') or 'draft'
+    return update_data
+
+def ownership_error(blog_id, action):
+    # Only called once a write filtered on {_id, author} matched nothing
+    if blogs_collection.find_one({"_id": ObjectId(blog_id)}, {"_id": 1}):
+        return jsonify({"message": f"Unauthorized to {action} this blog"}), 403
+    return jsonify({"message": "Blog not found"}), 404
+
 @blogs_bp.route("/blogs/<blog_id>", methods=["PUT"])
 @jwt_required()
 def update_blog(blog_id):
@@ -90,35 +154,33 @@ def update_blog(blog_id):
         current_user = get_jwt_identity()
         data = request.json
         
-        blog = blogs_collection.find_one({"_id": ObjectId(blog_id)})
-        if not blog:
-            return jsonify({"message": "Blog not found"}), 404
-        
-        if blog['author'] != current_user:
-            return jsonify({"message": "Unauthorized to update this blog"}), 403
-        
-        # Validate update data
-        update_data = {
-            "title": data.get('title', blog['title']),
-            "content": data.get('content', blog['content']),
-            "image": data.get('image', blog['image']),
-            "imageKey": data.get('imageKey', blog['imageKey']),
-            "status": data.get('status', blog['status']) if data.get('status') else 'draft',
-            "author": current_user,  # needed for validation
-            "updated_at": datetime.utcnow()
-        }
-        
-        errors = blog_schema.validate(update_data)
+        # Validate only the fields being changed
+        update_data = update_fields(data)
+        errors = blog_schema.validate(update_data, partial=True)
         if errors:
             return jsonify({"message": "Validation error", "errors": errors}), 400
         
-        blogs_collection.update_one(
-            {"_id": ObjectId(blog_id)},
-            {"$set": update_data}
-        )
+        update_data["updated_at"] = datetime.utcnow()
+        if "content" in update_data:
+            update_data["excerpt"] = make_excerpt(update_data["content"])
         
-        updated_blog = blogs_collection.find_one({"_id": ObjectId(blog_id)})
-        return jsonify(blog_schema.dump(updated_blog)), 200
+        # The author check is part of the filter, so the check and the write are one atomic call
+        def update(slug=None):
+            if slug is not None:
+                update_data["slug"] = slug
+            return blogs_collection.find_one_and_update(
+                {"_id": ObjectId(blog_id), "author": current_user},
+                {"$set": update_data},
+                return_document=ReturnDocument.AFTER
+            )
+        if "title" in update_data:
+            updated_blog = write_with_slug(blogs_collection, slugify(update_data["title"]), update, ObjectId(blog_id))
+        else:
+            updated_blog = update()
+        if not updated_blog:
+            return ownership_error(blog_id, "update")
+        invalidate("blog", blog_id)
+        return jsonify(blog_dumper.dump(updated_blog)), 200
     except Exception as e:
         return jsonify({"message": str(e)}), 400
 
@@ -127,19 +189,106 @@ def update_blog(blog_id):
 def delete_blog(blog_id):
     try:
         current_user = get_jwt_identity()
-        blog = blogs_collection.find_one({"_id": ObjectId(blog_id)})
-        
-        if not blog:
-            return jsonify({"message": "Blog not found"}), 404
-        
-        if blog['author'] != current_user:
-            return jsonify({"message": "Unauthorized to delete this blog"}), 403
-        
-        blogs_collection.delete_one({"_id": ObjectId(blog_id)})
+        deleted = blogs_collection.find_one_and_delete(
+            {"_id": ObjectId(blog_id), "author": current_user},
+            projection={"_id": 1}
+        )
+        if not deleted:
+            return ownership_error(blog_id, "delete")
+        invalidate("blog", blog_id)
         return jsonify({"message": "Blog deleted successfully"}), 200
     except Exception as e:
         return jsonify({"message": str(e)}), 400
 
+@blogs_bp.route("/blogs/bulk", methods=["POST"])
+@jwt_required()
+def bulk_blogs():
+    current_user = get_jwt_identity()
+    try:
+        operations = parse_operations(request.json)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    results = [operation_error(i, operation) for i, operation in enumerate(operations)]
+    for i, operation in enumerate(operations):
+        if results[i] is None and operation["op"] != "delete":
+            operation["data"]["author"] = current_user
+
+    # One validation pass for creates, and one partial pass for updates
+    for op, partial in (("create", False), ("update", True)):
+        indexes = [i for i, result in enumerate(results) if result is None and operations[i]["op"] == op]
+        errors = blogs_schema.validate([operations[i]["data"] for i in indexes], partial=partial)
+        for n, i in enumerate(indexes):
+            if n in errors:
+                results[i] = item_result(i, 400, error=errors[n])
+
+    target_ids = {ObjectId(operations[i]["id"]) for i, result in enumerate(results)
+                  if result is None and operations[i]["op"] != "create"}
+    found = fetch_targets(blogs_collection, target_ids, ("author", "slug"))
+
+    # Slugs for new posts and retitled ones, handed out together so the batch cannot collide with itself
+    retitled = []
+    for i, operation in enumerate(operations):
+        title = (operation.get("data") or {}).get("title")
+        if results[i] is not None or operation["op"] == "delete" or title is None:
+            continue
+        if operation["op"] == "update" and keeps_slug(found.get(ObjectId(operation["id"]), {}).get("slug"), slugify(title)):
+            continue
+        retitled.append(i)
+    slugs = dict(zip(retitled, batch_slugs(blogs_collection, [slugify(operations[i]["data"]["title"]) for i in retitled])))
+
+    now = datetime.utcnow()
+    requests, positions = [], []
+    for i, operation in enumerate(operations):
+        if results[i] is not None:
+            continue
+        data = operation.get("data")
+        if operation["op"] == "create":
+            blog = {
+                "_id": ObjectId(),
+                "title": data['title'],
+                "slug": slugs[i],
+                "image": data['image'],
+                "imageKey": data['imageKey'],
+                "content": data['content'],
+                "excerpt": make_excerpt(data['content']),
+                "author": current_user,
+                "created_at": now,
+                "updated_at": now,
+                "status": data.get('status', 'draft')
+            }
+            requests.append(InsertOne(blog))
+            results[i] = item_result(i, 201, blog["_id"])
+            positions.append(i)
+            continue
+
+        blog_id = ObjectId(operation["id"])
+        blog = found.get(blog_id)
+        if not blog:
+            results[i] = item_result(i, 404, error="Blog not found")
+            continue
+        if blog['author'] != current_user:
+            results[i] = item_result(i, 403, error=f"Unauthorized to {operation['op']} this blog")
+            continue
+        if operation["op"] == "update":
+            update_data = update_fields(data)
+            update_data["updated_at"] = now
+            if i in slugs:
+                update_data["slug"] = slugs[i]
+            if "content" in update_data:
+                update_data["excerpt"] = make_excerpt(update_data["content"])
+            requests.append(UpdateOne({"_id": blog_id, "author": current_user}, {"$set": update_data}))
+        else:
+            requests.append(DeleteOne({"_id": blog_id, "author": current_user}))
+        results[i] = item_result(i, 200, blog_id)
+        positions.append(i)
+
+    execute(blogs_collection, requests, positions, results)
+    if any(operations[i]["op"] != "create" for i in positions):
+        invalidate("blog")
+    body, status = summary(results)
+    return jsonify(body), status
+
 @blogs_bp.route("/blogs/user", methods=["GET"])
 @jwt_required()
 def get_user_blogs():
@@ -152,23 +301,32 @@ def get_user_blogs():
     if status:
         query["status"] = status
     
-    total = blogs_collection.count_documents(query)
-    blogs = blogs_collection.find(query)\
-        .sort("created_at", -1)\
-        .skip((page - 1) * per_page)\
-        .limit(per_page)
+    try:
+        projection = list_projection(request.args.get('fields'), request.args.get('view'), BLOG_SUMMARY)
+        include_total = parse_include_total(request.args.get('include_total'))
+        if 'cursor' in request.args:
+            blogs, total, next_cursor = keyset_page(blogs_collection, query, "created_at", request.args.get('cursor'), per_page, include_total, projection)
+        else:
+            blogs, total, has_next = fetch_page(blogs_collection, query, RECENT_FIRST, per_page,
+                                                skip=(page - 1) * per_page, include_total=include_total, projection=projection)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
     
-    blog_list = []
-    for blog in blogs:
-        blog['_id'] = str(blog['_id'])
-        blog_list.append(blog)
+    if 'cursor' in request.args:
+        return jsonify({
+            "blogs": blogs,
+            "total": total,
+            "per_page": per_page,
+            "next_cursor": next_cursor
+        }), 200
     
     return jsonify({
-        "blogs": blog_list,
+        "blogs": blogs,
         "total": total,
         "page": page,
         "per_page": per_page,
-        "total_pages": (total + per_page - 1) // per_page
+        "total_pages": page_count(total, per_page),
+        "has_next": has_next
     }), 200
 
 @blogs_bp.route("/blogs/filter", methods=["POST"])
@@ -177,23 +335,30 @@ def filter_blogs():
     page = int(data.get('page', 1))
     per_page = int(data.get('per_page', 10))
     keyword = data.get('keyword', '')
+    # mode "text" uses the title/content text index; sort "score" orders by relevance
+    sort = data.get('sort', 'recent')
     
-    query = {}
-    if keyword:
-        query["$or"] = [
-            {"title": {"$regex": keyword, "$options": "i"}},
-            {"content": {"$regex": keyword, "$options": "i"}}
-        ]
-    
-    total = blogs_collection.count_documents(query)
-    blogs = blogs_collection.find(query)\
-        .sort("created_at", -1)\
-        .skip((page - 1) * per_page)\
-        .limit(per_page)
+    try:
+        query = search_query(keyword, data.get('mode', 'regex'), ["title", "content"])
+        projection, dumper = requested_projection(data)
+        include_total = parse_include_total(data.get('include_total'))
+        if 'cursor' in data:
+            blogs, total, next_cursor = keyset_page(blogs_collection, query, "created_at", data.get('cursor'), per_page, include_total, projection)
+            return jsonify({
+                "items": dumper.dump(blogs),
+                "total": total,
+                "next_cursor": next_cursor
+            }), 200
+        
+        blogs, total, has_next = fetch_page(blogs_collection, query, search_sort(query, sort, "created_at"), per_page,
+                                            skip=(page - 1) * per_page, include_total=include_total, projection=projection)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
     
     return jsonify({
-        "items": blogs_schema.dump(blogs),
+        "items": dumper.dump(blogs),
         "total": total,
         "page": page,
-        "pages": (total + per_page - 1) // per_page
+        "pages": page_count(total, per_page),
+        "has_next": has_next
     }), 200 
\ No newline at end of file
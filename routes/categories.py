@@ -1,44 +1,80 @@
 from flask import Blueprint, request, jsonify
 from models.category import Category
-from db.mongo_client import get_db
+from db.mongo_client import lazy_db
 from bson import ObjectId
 from datetime import datetime
 from flask_jwt_extended import jwt_required
+from pymongo.errors import DuplicateKeyError
+from db.pagination import keyset_page, fetch_page, parse_include_total, page_count
+from db.search import search_query, search_sort
+from routes.conditional import conditional_document, conditional_render, conditional_list
+from db.cache import get_cache, invalidate
+from db.category_names import CATEGORY_NAMES, category_by_name
+from db.denormalize import category_copy, propagate_category
+from db.slugs import slugify, write_with_slug
 
 categories_bp = Blueprint('categories', __name__)
-db = get_db()
+db = lazy_db()
 categories_collection = db.get_collection('categories')
 products_collection = db.get_collection('products')
 
-@categories_bp.route('/categories', methods=['GET'])
-def get_categories():
-    categories = categories_collection.find()
-    return jsonify([{
+def category_list_item(c):
+    return {
         'id': str(c['_id']),
         'name': c['name'],
+        'slug': c.get('slug'),
         'image': c['image'] if 'image' in c else None,
         # 'imageKey': c['imageKey'] if 'imageKey' in c else None,
-    } for c in categories])
+    }
+
+@categories_bp.route('/categories', methods=['GET'])
+def get_categories():
+    categories = get_cache('categories').get_or_load('all', lambda: [
+        category_list_item(c) for c in categories_collection.find()
+    ])
+    return conditional_list(jsonify(categories))
 
 @categories_bp.route('/categories', methods=['POST'])
 def create_category():
     data = request.get_json()
-    category = Category(name=data['name'], image=data['image'], imageKey=data['imageKey'])
-    result = categories_collection.insert_one(category.to_dict())
-    return jsonify({'id': str(result.inserted_id), 'name': data['name']}), 201
+    category = Category(name=data['name'], image=data['image'], imageKey=data['imageKey']).to_dict()
+    def insert(slug):
+        category['slug'] = slug
+        return categories_collection.insert_one(category)
+    try:
+        result = write_with_slug(categories_collection, slugify(data['name']), insert)
+    except DuplicateKeyError:
+        return jsonify({'message': f"Category name '{data['name']}' already exists"}), 409
+    invalidate('categories')
+    invalidate(CATEGORY_NAMES)
+    return jsonify({'id': str(result.inserted_id), 'name': data['name'], 'slug': category['slug']}), 201
 
 @categories_bp.route('/categories/<id>', methods=['PUT'])
 def update_category(id):
     data = request.get_json()
-    categories_collection.update_one(
-        {'_id': ObjectId(id)},
-        {'$set': {
-            'name': data.get('name'),
-            'image': data.get('image'),
-            'imageKey': data.get('imageKey'),
-            'updated_at': datetime.utcnow()
-        }}
-    )
+    fields = {
+        'name': data.get('name'),
+        'image': data.get('image'),
+        'imageKey': data.get('imageKey'),
+        'updated_at': datetime.utcnow()
+    }
+    def update(slug=None):
+        if slug is not None:
+            fields['slug'] = slug
+        return categories_collection.update_one({'_id': ObjectId(id)}, {'$set': fields})
+    try:
+        if data.get('name'):
+            result = write_with_slug(categories_collection, slugify(data['name']), update, ObjectId(id))
+        else:
+            result = update()
+    except DuplicateKeyError:
+        return jsonify({'message': f"Category name '{data.get('name')}' already exists"}), 409
+    invalidate('category', id)
+    invalidate('categories')
+    invalidate(CATEGORY_NAMES)
+    # Products keep a copy of the name and image; refresh them all in one update_many
+    if result.matched_count and propagate_category(db, ObjectId(id), data):
+        invalidate('product')
     return jsonify({'id': id, 'name': data.get('name')})
 
 @categories_bp.route('/categories/<id>', methods=['DELETE'])
@@ -47,22 +83,37 @@ def delete_category(id):
     categories_collection.delete_one({'_id': ObjectId(id)})
     products_collection.update_many(
         {'categoryId': ObjectId(id)},
-        {'$set': {'categoryId': None, 'categoryName': None}}
-    )   
+        {'$set': {'categoryId': None, **category_copy(None), 'updatedAt': datetime.now()}}
+    )
+    invalidate('category', id)
+    invalidate('categories')
+    invalidate(CATEGORY_NAMES)
+    invalidate('product')
     return jsonify({'message': 'Category deleted successfully'}), 200
 
 @categories_bp.route('/categories/<id>', methods=['GET'])
 def get_category(id):
-    category = categories_collection.find_one({'_id': ObjectId(id)})
-    if not category:
-        return jsonify({'message': 'Category not found'}), 404
-    return jsonify({
+    response = conditional_document(categories_collection, {'_id': ObjectId(id)}, 'updated_at', lambda category: jsonify({
         'id': str(category['_id']),
         'name': category['name'],
         'image': category['image'] if 'image' in category else None,
         'imageKey': category['imageKey'] if 'imageKey' in category else None,
-    })
+    }), cache=get_cache('category'))
+    if not response:
+        return jsonify({'message': 'Category not found'}), 404
+    return response
+
 
+def category_item(c):
+    return {
+        'id': str(c['_id']),
+        'name': c['name'],
+        'slug': c.get('slug'),
+        'image': c['image'] if 'image' in c else None,
+        'imageKey': c['imageKey'] if 'imageKey' in c else None,
+        'created_at': c['created_at'],
+        'updated_at': c['updated_at']
+    }
 
 @categories_bp.route('/categories/filter', methods=['POST'])
 def filter_categories():
@@ -70,40 +121,41 @@ def filter_categories():
     page = int(data.get('page', 1))
     per_page = int(data.get('per_page', 10))
     keyword = data.get('keyword', '')
+    sort = data.get('sort', 'recent')
     
-    query = {}
+    try:
+        query = search_query(keyword, data.get('mode', 'regex'), ['name'])
+        include_total = parse_include_total(data.get('include_total'))
 
-    if keyword:
-        query['name'] = {'$regex': keyword, '$options': 'i'}
+        if 'cursor' in data:
+            categories, total, next_cursor = keyset_page(categories_collection, query, 'created_at', data.get('cursor'), per_page, include_total)
+            return jsonify({
+                'items': [category_item(c) for c in categories],
+                'total': total,
+                'next_cursor': next_cursor
+            })
 
-    total = categories_collection.count_documents(query)
-    pages = (total + per_page - 1) // per_page
-
-    categories = categories_collection.find(query).skip((page - 1) * per_page).limit(per_page)
+        categories, total, has_next = fetch_page(categories_collection, query, search_sort(query, sort, 'created_at'), per_page,
+                                                 skip=(page - 1) * per_page, include_total=include_total)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
     
     return jsonify({
-        'items': [{
-            'id': str(c['_id']),
-            'name': c['name'],
-            'image': c['image'] if 'image' in c else None,
-            'imageKey': c['imageKey'] if 'imageKey' in c else None,
-            'created_at': c['created_at'],
-            'updated_at': c['updated_at']
-        } for c in categories],
+        'items': [category_item(c) for c in categories],
         'page': page,
-        'pages': pages,
-        'total': total
+        'pages': page_count(total, per_page),
+        'total': total,
+        'has_next': has_next
     }) 
 
 @categories_bp.route('/categories/<name>/name', methods=['GET'])
 def get_categorie_by_name(name):
-
-
-    category = categories_collection.find_one({'name': name.replace('_', ' ')})
+    # Served from the in-memory name map; no query once it is loaded
+    category = category_by_name(db, name.replace('_', ' '))
     if not category:
         return jsonify({'message': 'Category not found'}), 404
-    return jsonify({
+    return conditional_render(category, 'updated_at', lambda category: jsonify({
         # 'id': str(category['_id']),
         'name': category['name'],
         'image': category['image'] if 'image' in category else None,
-    })
+    }))
@@ -0,0 +1,71 @@
+import hashlib
+from datetime import timezone
+from flask import Response, make_response, request
+
+def has_validators():
+    return bool(request.if_none_match or request.if_modified_since)
+
+def validators(doc, updated_field):
+    # A document's version is its id plus its last update time
+    updated = doc.get(updated_field)
+    etag = hashlib.sha1(f"{doc['_id']}:{updated.isoformat() if updated else ''}".encode()).hexdigest()
+    # Stored datetimes are naive UTC; HTTP dates have second precision
+    last_modified = updated.replace(tzinfo=timezone.utc, microsecond=0) if updated else None
+    return etag, last_modified
+
+def with_validators(response, etag, last_modified):
+    response = make_response(response)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    return response
+
+def not_modified(etag, last_modified):
+    # Returns a 304 when the client's copy is current, otherwise None.
+    # If-None-Match takes precedence over If-Modified-Since.
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified:
+        fresh = last_modified <= request.if_modified_since
+    else:
+        fresh = False
+    if not fresh:
+        return None
+    return with_validators(Response(status=304), etag, last_modified)
+
+def conditional_list(response):
+    # Lists have no single version, so the ETag is a hash of the serialised body
+    response = make_response(response)
+    if response.status_code != 200 or response.is_streamed:
+        return response
+    response.add_etag()
+    return response.make_conditional(request)
+
+def conditional_render(doc, updated_field, render):
+    # For a document already in memory; render gets a copy so the caller's stays intact
+    etag, last_modified = validators(doc, updated_field)
+    return not_modified(etag, last_modified) or with_validators(render(dict(doc)), etag, last_modified)
+
+def conditional_document(collection, query, updated_field, render, cache=None):
+    # Returns None when no document matches. When the client sent validators only the
+    # version fields are fetched first, so a 304 never loads or serialises the body.
+    # With a cache (keyed by str(_id), for _id queries) the document comes from memory.
+    if cache is not None and set(query) == {"_id"}:
+        doc = cache.get_or_load(str(query["_id"]), lambda: collection.find_one(query))
+        if not doc:
+            return None
+        return conditional_render(doc, updated_field, render)
+    if has_validators():
+        meta = collection.find_one(query, {updated_field: 1})
+        if not meta:
+            return None
+        etag, last_modified = validators(meta, updated_field)
+        cached = not_modified(etag, last_modified)
+        if cached:
+            return cached
+        query = {"_id": meta["_id"]}
+    doc = collection.find_one(query)
+    if not doc:
+        return None
+    etag, last_modified = validators(doc, updated_field)
+    return with_validators(render(doc), etag, last_modified)
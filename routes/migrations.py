@@ -0,0 +1,25 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required
+from db.mongo_client import lazy_db
+from db.migrations import migration_states, start_migration_job, job_running
+
+migrations_bp = Blueprint('migrations', __name__)
+db = lazy_db()
+
+@migrations_bp.route("/migrations", methods=["GET"])
+@jwt_required()
+def get_migrations():
+    return jsonify({"running": job_running(), "migrations": migration_states(db)}), 200
+
+@migrations_bp.route("/migrations", methods=["POST"])
+@jwt_required()
+def run_migrations():
+    # Optional {"to": N} stops after migration N
+    target = (request.get_json(silent=True) or {}).get("to")
+    try:
+        target = int(target) if target is not None else None
+    except (TypeError, ValueError):
+        return jsonify({"message": "to must be a migration version"}), 400
+    if not start_migration_job(db, target):
+        return jsonify({"message": "Migrations are already running"}), 409
+    return jsonify({"message": "Migrations started"}), 202
@@ -1,18 +1,47 @@
 from flask import Blueprint, request, jsonify
 from bson.objectid import ObjectId
 from flask_jwt_extended import jwt_required
-from db.mongo_client import get_db
+from db.mongo_client import lazy_db
+from db.category_names import category_by_name
+from db.pagination import keyset_page, fetch_page, parse_include_total, page_count
+from db.search import search_query, search_sort
+from routes.streaming import stream_format, stream_response, batch_size, chunked
+from routes.conditional import conditional_document, conditional_list
+from db.cache import get_cache, invalidate
+from db.projection import list_projection, make_excerpt
+from db.bulk import parse_operations, operation_error, item_result, fetch_targets, execute, summary
+from pymongo import InsertOne, UpdateOne, DeleteOne
+from db.migrations import start_migration_job
+from db.denormalize import category_copy_for, category_copies, category_copy
+from bson.errors import InvalidId
 from marshmallow import ValidationError
-from models.product import product_schema
+from models.product import product_schema, PRODUCT_SUMMARY
 from datetime import datetime
 
 # Initialize the blueprint
 products_bp = Blueprint('products', __name__)
 
 # Get the database connection
-db = get_db()
+db = lazy_db()
 products_collection = db.get_collection('products')
-categories_collection = db.get_collection('categories')
+
+def requested_projection(params):
+    # fields=name,price or view=summary; None means full documents
+    projection = list_projection(params.get('fields'), params.get('view'), PRODUCT_SUMMARY)
+    if projection is not None and "categoryId" in projection:
+        projection["categoryName"] = 1
+    return projection
+
+def category_fields(products, projection=None):
+    # categoryName is stored on each product; this only keeps the response shape
+    if projection is not None and "categoryId" not in projection:
+        return products
+    # _id is left as an ObjectId; the JSON provider writes it as its hex string
+    for product in products:
+        category_id = product.get("categoryId")
+        product["categoryName"] = (product.get("categoryName") or "") if category_id else ""
+        product["categoryId"] = str(category_id) if "categoryId" in product else ""
+    return products
 
 @products_bp.route("/products", methods=["POST"])
 @jwt_required()
@@ -21,6 +50,8 @@ def create_product():
         data = product_schema.load(request.json)
         data["price"] = float(data["price"] or 0)
         data["categoryId"] = ObjectId(data["categoryId"])
+        data.update(category_copy_for(db, data["categoryId"]))
+        data["excerpt"] = make_excerpt(data["description"])
         data["createdAt"] = datetime.now()
         data["updatedAt"] = datetime.now()
     except ValidationError as err:
@@ -32,12 +63,27 @@ def create_product():
 
 @products_bp.route("/products", methods=["GET"])
 def get_products():
-    products = list(products_collection.find())
-    for product in products:
-        product["_id"] = str(product["_id"])
-        # Ensure images is a list
-        product["images"] = product.get("images", [])
-    return jsonify(products), 200
+    try:
+        projection = requested_projection(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 422
+
+    def serialize(products):
+        category_fields(products, projection)
+        if projection is None or "images" in projection:
+            for product in products:
+                # Ensure images is a list
+                product["images"] = product.get("images", [])
+        return products
+
+    fmt = stream_format()
+    if fmt:
+        size = batch_size()
+        cursor = products_collection.find({}, projection).batch_size(size)
+        return stream_response((serialize(chunk) for chunk in chunked(cursor, size)), fmt)
+
+    products = serialize(list(products_collection.find({}, projection)))
+    return conditional_list(jsonify(products))
 
 @products_bp.route("/products/filter", methods=["POST"])
 # @jwt_required()
@@ -51,6 +97,8 @@ def get_productsFiltered():
         page = data.get('page', 1)
         limit = data.get('limit', 10)
         keyword = data.get('keyword', '')
+        # mode "text" uses the name/description text index; sort "score" orders by relevance
+        sort = data.get('sort', 'recent')
 
         # Ensure page and limit are integers
         try:
@@ -59,31 +107,43 @@ def get_productsFiltered():
         except ValueError:
             return jsonify({"error": "Page and limit must be integers"}), 422
 
+        try:
+            query = search_query(keyword, data.get('mode', 'regex'), ["name"])
+            projection = requested_projection(data)
+            include_total = parse_include_total(data.get('include_total'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 422
+
+        if 'cursor' in data:
+            try:
+                products, total_products, next_cursor = keyset_page(products_collection, query, "createdAt", data.get('cursor'), limit, include_total, projection)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            category_fields(products, projection)
+            return jsonify({
+                "items": products,
+                "total": total_products,
+                "next_cursor": next_cursor
+            }), 200
+
         # Calculate the offset
         skip = (page - 1) * limit
         
-        # Fetch the products with pagination and sort by recent
-        products = list(products_collection.find(
-            {"name": {"$regex": keyword, "$options": "i"}}
-        ).sort("createdAt", -1).skip(skip).limit(limit))
-        
-        for product in products:
-            product["_id"] = str(product["_id"])
-            # Convert string ID back to ObjectId for lookup
-            category = categories_collection.find_one({"_id": product["categoryId"]}) if "categoryId" in product else None
-            product["categoryId"] = str(product["categoryId"]) if "categoryId" in product else ""
-            product["categoryName"] = category["name"] if category else ""
-
-        # Get the total count of products matching the keyword
-        total_products = products_collection.count_documents(
-            {"name": {"$regex": keyword, "$options": "i"}}
+        # Fetch the page, then the total count of matching products
+        products, total_products, has_next = fetch_page(
+            products_collection, query, search_sort(query, sort, "createdAt"), limit,
+            skip=skip, include_total=include_total, projection=projection
         )
+        category_fields(products, projection)
+        for product in products:
+            product.pop("score", None)
         
         return jsonify({
             "items": products,
             "total": total_products,
             "page": page,
-            "pages": (total_products + limit - 1) // limit
+            "pages": page_count(total_products, limit),
+            "has_next": has_next
         }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -91,15 +151,15 @@ def get_productsFiltered():
 
 @products_bp.route("/products/<product_id>", methods=["GET"])
 def get_product(product_id):
-    product = products_collection.find_one({"_id": ObjectId(product_id)})
-    if product:
-        product["_id"] = str(product["_id"])
+    def render(product):
+        category_fields([product])
         product["images"] = product.get("images", [])  # Ensure images is a list
-        category = categories_collection.find_one({"_id": product["categoryId"]}) if "categoryId" in product else None
-        product["categoryName"] = category["name"] if category else ""
-        product["categoryId"] = str(product["categoryId"])
+        return jsonify(product)
 
-        return jsonify(product), 200
+    response = conditional_document(products_collection, {"_id": ObjectId(product_id)}, "updatedAt", render,
+                                    cache=get_cache("product"))
+    if response:
+        return response
     return jsonify({"error": "Product not found"}), 404
 
 @products_bp.route("/products/<product_id>", methods=["PUT"])
@@ -109,11 +169,14 @@ def update_product(product_id):
         data = product_schema.load(request.json)
         data["price"] = float(data["price"] or 0)
         data["categoryId"] = ObjectId(data["categoryId"]) if "categoryId" in data else None
+        data.update(category_copy_for(db, data["categoryId"]))
+        data["excerpt"] = make_excerpt(data["description"])
         data["updatedAt"] = datetime.now()
     except ValidationError as err:
         return jsonify(err.messages), 400
 
     result = products_collection.update_one({"_id": ObjectId(product_id)}, {"$set": data})
+    invalidate("product", product_id)
     if result.matched_count:
         return jsonify({"message": "Product updated"}), 200
     return jsonify({"error": "Product not found"}), 404
@@ -122,97 +185,139 @@ def update_product(product_id):
 @jwt_required()
 def delete_product(product_id):
     result = products_collection.delete_one({"_id": ObjectId(product_id)})
+    invalidate("product", product_id)
     if result.deleted_count:
         return jsonify({"message": "Product deleted"}), 200
     return jsonify({"error": "Product not found"}), 404
 
+@products_bp.route("/products/bulk", methods=["POST"])
+@jwt_required()
+def bulk_products():
+    try:
+        operations = parse_operations(request.json)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 422
+
+    results = [operation_error(i, operation) for i, operation in enumerate(operations)]
+
+    # Validate every create/update payload in a single schema pass
+    payload_indexes = [i for i, result in enumerate(results) if result is None and operations[i]["op"] != "delete"]
+    try:
+        loaded, errors = product_schema.load([operations[i]["data"] for i in payload_indexes], many=True), {}
+    except ValidationError as err:
+        loaded, errors = err.valid_data, err.messages
+
+    now = datetime.now()
+    payloads = {}
+    for n, i in enumerate(payload_indexes):
+        if n in errors:
+            results[i] = item_result(i, 400, error=errors[n])
+            continue
+        data = loaded[n]
+        try:
+            data["categoryId"] = ObjectId(data["categoryId"]) if "categoryId" in data else None
+        except InvalidId:
+            results[i] = item_result(i, 400, error={"categoryId": ["Invalid id"]})
+            continue
+        data["price"] = float(data.get("price") or 0)
+        data["excerpt"] = make_excerpt(data["description"])
+        data["updatedAt"] = now
+        payloads[i] = data
+
+    # Category copies for the whole batch in one lookup
+    copies = category_copies(db, [data["categoryId"] for data in payloads.values()])
+    for data in payloads.values():
+        data.update(copies.get(data["categoryId"]) or category_copy(None))
+
+    target_ids = {ObjectId(operations[i]["id"]) for i, result in enumerate(results)
+                  if result is None and operations[i]["op"] != "create"}
+    found = fetch_targets(products_collection, target_ids)
+
+    requests, positions = [], []
+    for i, operation in enumerate(operations):
+        if results[i] is not None:
+            continue
+        if operation["op"] == "create":
+            product = payloads[i]
+            product["_id"] = ObjectId()
+            product["createdAt"] = now
+            requests.append(InsertOne(product))
+            results[i] = item_result(i, 201, product["_id"])
+        else:
+            product_id = ObjectId(operation["id"])
+            if product_id not in found:
+                results[i] = item_result(i, 404, error="Product not found")
+                continue
+            if operation["op"] == "update":
+                requests.append(UpdateOne({"_id": product_id}, {"$set": payloads[i]}))
+            else:
+                requests.append(DeleteOne({"_id": product_id}))
+            results[i] = item_result(i, 200, product_id)
+        positions.append(i)
+
+    execute(products_collection, requests, positions, results)
+    if any(operations[i]["op"] != "create" for i in positions):
+        # One broadcast for the whole batch rather than one per product
+        invalidate("product")
+    body, status = summary(results)
+    return jsonify(body), status
+
 @products_bp.route("/products/category/<category_id>", methods=["GET"])
 def get_products_by_category(category_id):
     try:
-        products = list(products_collection.find({"categoryId": ObjectId(category_id)}))
-        for product in products:
-            product["_id"] = str(product["_id"])
-            category = categories_collection.find_one({"_id": product["categoryId"]}) if "categoryId" in product else None
-            product["categoryId"] = str(product["categoryId"])
-            product["categoryName"] = category["name"] if category else ""
-        return jsonify(products), 200
+        projection = requested_projection(request.args)
+        products = category_fields(list(products_collection.find({"categoryId": ObjectId(category_id)}, projection)), projection)
+        return conditional_list(jsonify(products))
     except Exception as e:
         return jsonify({"error": str(e)}), 500 
     
     # Get all products by category name
 @products_bp.route('/products/category/<category_name>/name', methods=['GET'])
 def get_products_by_category_name(category_name):
-        name = category_name.lower()
-        products = list(products_collection.find())
+        # Resolve the name through the in-memory name map (case-insensitive, like the unique index)
+        category = category_by_name(db, category_name)
+        if not category:
+            return jsonify([]), 200
+
+        try:
+            projection = requested_projection(request.args)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 422
+
+        cursor = products_collection.find({"categoryId": category["_id"]}, projection).sort("createdAt", -1)
+        if "page" in request.args:
+            page = int(request.args.get('page', 1))
+            per_page = int(request.args.get('per_page', 10))
+            cursor = cursor.skip((page - 1) * per_page).limit(per_page)
+
+        products = list(cursor)
         for product in products:
-            product["_id"] = str(product["_id"])
-            category = categories_collection.find_one({"_id": product["categoryId"]}) if "categoryId" in product else None
-            product["categoryId"] = str(product["categoryId"])
-            product["categoryName"] = category["name"].lower() if category else ""  
-        products = [product for product in products if product["categoryName"] == name]
+            if "categoryId" in product:
+                product["categoryId"] = str(product["categoryId"])
+                product["categoryName"] = category["name"].lower()
         
-        return jsonify(products), 200
+        return conditional_list(jsonify(products))
 
 @products_bp.route('/products/ids', methods=['GET'])
 def get_all_products_ids():
+    fmt = stream_format()
+    if fmt:
+        size = batch_size()
+        cursor = products_collection.find({}, {'_id': 1}).batch_size(size)
+        return stream_response(([str(product['_id']) for product in chunk] for chunk in chunked(cursor, size)), fmt)
+
     products = products_collection.find({}, {'_id': 1})
     product_ids = [str(product['_id']) for product in products]
-    return jsonify(product_ids)
+    return conditional_list(jsonify(product_ids))
 
 
 @products_bp.route('/update-product-fields', methods=['POST'])
 def update_product_fields():
-    try:
-        # Get all products
-        products = products_collection.find()
-        
-        # Counter for updated records
-        updated_count = 0
-        
-        # Process each product
-        for product in products:
-            update_data = {}
-            
-            # Check and update image field
-            if 'image' in product and 'images' not in product:
-                update_data['images'] = [product['image']]
-                update_data['image'] = None  # To unset the old field
-            
-            # Check and update imageKey field
-            if 'imageKey' in product and 'imageKeys' not in product:
-                update_data['imageKeys'] = [product['imageKey']]
-                update_data['imageKey'] = None  # To unset the old field
-            
-            # If we have updates to make
-            if update_data:
-                # Use $set and $unset operators for MongoDB
-                update_query = {}
-                if 'images' in update_data or 'imageKeys' in update_data:
-                    update_query['$set'] = {
-                        k: v for k, v in update_data.items() 
-                        if k in ['images', 'imageKeys']
-                    }
-                if None in update_data.values():
-                    update_query['$unset'] = {
-                        k: "" for k, v in update_data.items() 
-                        if v is None
-                    }
-                
-                result = products_collection.update_one(
-                    {"_id": product["_id"]},
-                    update_query
-                )
-                if result.modified_count:
-                    updated_count += 1
-        
-        return jsonify({
-            'status': 'success',
-            'message': f'Updated {updated_count} products successfully',
-            'updated_count': updated_count
-        }), 200
-    
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': f'Error updating products: {str(e)}'
-        }), 500
\ No newline at end of file
+    # Kept for existing callers: the image/imageKey conversion is now migration 1, and this
+    # unauthenticated route runs nothing past it; later migrations go through /api/migrations
+    started = start_migration_job(db, target=1)
+    return jsonify({
+        'status': 'accepted' if started else 'running',
+        'message': 'Migrations started' if started else 'Migrations are already running',
+        'status_url': '/api/migrations'
+    }), 202
@@ -0,0 +1,49 @@
+from itertools import islice
+from flask import Response, current_app, request, stream_with_context
+
+DEFAULT_BATCH_SIZE = 500
+NDJSON = "application/x-ndjson"
+
+def stream_format():
+    # ?format=ndjson (or Accept: application/x-ndjson) streams one document per line,
+    # ?format=stream streams a regular JSON array; anything else keeps the buffered response
+    fmt = request.args.get('format')
+    if fmt in ("ndjson", "stream"):
+        return fmt
+    if request.accept_mimetypes.best == NDJSON:
+        return "ndjson"
+    return None
+
+def batch_size():
+    return max(1, int(request.args.get('batch_size', DEFAULT_BATCH_SIZE)))
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+def stream_response(chunks, fmt):
+    # chunks yields lists of already serialisable items; each list is written as one piece
+    # so memory stays bounded by the batch size instead of the result set
+    def dumps(item):
+        return current_app.json.dumps(item, separators=(",", ":"))
+
+    def generate_ndjson():
+        for chunk in chunks:
+            yield "".join(dumps(item) + "\n" for item in chunk)
+
+    def generate_array():
+        yield "["
+        first = True
+        for chunk in chunks:
+            if chunk:
+                yield ("" if first else ",") + ",".join(dumps(item) for item in chunk)
+                first = False
+        yield "]\n"
+
+    if fmt == "ndjson":
+        return Response(stream_with_context(generate_ndjson()), mimetype=NDJSON)
+    return Response(stream_with_context(generate_array()), mimetype="application/json")
@@ -1,32 +1,52 @@
 from datetime import datetime, timezone
 from flask import Blueprint, request, jsonify, make_response
-from flask_jwt_extended import create_access_token, create_refresh_token, jwt_required, get_jwt_identity, decode_token, get_jwt
-from flask_jwt_extended.exceptions import NoAuthorizationError, InvalidHeaderError, WrongTokenError, RevokedTokenError, FreshTokenRequired, CSRFError
-import jwt
+from flask_jwt_extended import create_access_token, create_refresh_token, decode_token, jwt_required, get_jwt_identity, get_jwt
 from models.user import user_schema
-from db.mongo_client import get_db
-from werkzeug.security import generate_password_hash, check_password_hash
+from db.mongo_client import lazy_db
+from db.token_blocklist import revoke
+from models.passwords import hash_password, verify_password, needs_rehash, HashPoolBusy
 
 users_bp = Blueprint('users', __name__)
-db = get_db()
+db = lazy_db()
 users_collection = db.get_collection('users')
 
+@users_bp.errorhandler(HashPoolBusy)
+def hash_pool_busy(e):
+    # Password hashing is saturated; fail fast rather than queue behind it
+    response = jsonify({"message": "Server busy, please retry"})
+    response.headers["Retry-After"] = "1"
+    return response, 503
+
 @users_bp.route("/register", methods=["POST"])
 def register():
     data = request.json
-    data['password'] = generate_password_hash(data['password'])
     if users_collection.find_one({"username": data['username']}):
         return jsonify({"error": "User already exists"}), 400
+    data['password'] = hash_password(data['password'])
     users_collection.insert_one(data)
     return jsonify({"message": "User registered successfully"}), 201
 
+def session_claims(refresh_claims):
+    # Access tokens carry the id and expiry of the refresh token they belong to, so logging
+    # out with either kind of token can revoke both
+    return {"refresh_jti": refresh_claims['jti'], "refresh_exp": refresh_claims['exp']}
+
 @users_bp.route("/login", methods=["POST"])
 def login():
     data = request.json
     user = users_collection.find_one({"username": data['username']})
-    if user and check_password_hash(user['password'], data['password']):
-        access_token = create_access_token(identity=user['username'])
+    if user and verify_password(user['password'], data['password']):
+        if needs_rehash(user['password']):
+            # PASSWORD_HASH_METHOD changed since this password was stored
+            try:
+                users_collection.update_one(
+                    {"_id": user['_id'], "password": user['password']},
+                    {"$set": {"password": hash_password(data['password'])}}
+                )
+            except HashPoolBusy:
+                pass  # try again at the next login
         refresh_token = create_refresh_token(identity=user['username'])
+        access_token = create_access_token(identity=user['username'], additional_claims=session_claims(decode_token(refresh_token)))
         user_data = {
             "username": user['username'],
             "role": user['role'],
@@ -52,12 +72,18 @@ def protected():
 @jwt_required(refresh=True)
 def refresh():
     current_user = get_jwt_identity()
-    access_token = create_access_token(identity=current_user)
+    access_token = create_access_token(identity=current_user, additional_claims=session_claims(get_jwt()))
     return jsonify(access_token=access_token), 200
 
 @users_bp.route("/logout", methods=["POST"])
-@jwt_required()
+@jwt_required(verify_type=False)
 def logout():
+    # Revoke the token itself, not just the cookie holding it, and the refresh token of the
+    # same login so it cannot mint new access tokens
+    claims = get_jwt()
+    revoke(claims['jti'], claims['exp'])
+    if claims.get('refresh_jti'):
+        revoke(claims['refresh_jti'], claims['refresh_exp'])
     response = make_response(jsonify({"message": "Logged out successfully"}))
     response.set_cookie('authToken', '', httponly=True, secure=False, samesite='Strict', expires=0)
     return response, 200
@@ -65,25 +91,9 @@ def logout():
 @users_bp.route("/isTokenExpired", methods=["GET"]) 
 @jwt_required()
 def isTokenExpired():
-    auth_header = request.headers.get('Authorization')
-    if not auth_header:
-        return jsonify({"message": "Authorization header is missing"}), 400
-
-    try:
-        token = auth_header.split()[1]
-    except IndexError:
-        return jsonify({"message": "Bearer token is malformed"}), 400
-
-    try:
-        decoded_token = decode_token(token)
-        exp_timestamp = decoded_token['exp']
-        current_timestamp = datetime.now(timezone.utc).timestamp()
-        if exp_timestamp < current_timestamp:
-            return jsonify({"message": "Token is expired"}), 401
-    except (NoAuthorizationError, InvalidHeaderError, WrongTokenError, RevokedTokenError, FreshTokenRequired, CSRFError) as e:
-        return jsonify({"message": "Token verification failed", "error": str(e)}), 422
-    except Exception as e:
-        return jsonify({"message": "Error decoding token", "error": str(e)}), 400
-
+    # jwt_required has already decoded and verified the token
+    exp_timestamp = get_jwt()['exp']
+    current_timestamp = datetime.now(timezone.utc).timestamp()
+    if exp_timestamp < current_timestamp:
+        return jsonify({"message": "Token is expired"}), 401
     return jsonify({"message": "Token is not expired"}), 200
-
@@ -1,38 +1,102 @@
+import time
+# Startup time (GET /readyz, GET /api/stats) is measured from here
+IMPORT_STARTED = time.perf_counter()
+
 import os
-from flask import Flask
+import multiprocessing
+from flask import Flask, Response, jsonify
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 from routes.products import products_bp
 from routes.users import users_bp
 from routes.blogs import blogs_bp
 from routes.categories import categories_bp
-from db.mongo_client import get_db
+from routes.migrations import migrations_bp
+from db.mongo_client import lazy_db, pool_stats
+from db.cache import cache_stats
+from models.passwords import password_stats
+from db.token_blocklist import is_revoked
+from server.health import health_bp, startup, start_warm_up
+from server.metrics import init_metrics, local_snapshot, render_prometheus
+from server.worker_metrics import shared_snapshot, start_writer, write_snapshot
+from server.serialization import MongoJSONProvider, ORJSONProvider, orjson_enabled
+from config import get_config
 from waitress import serve
 from datetime import timedelta
 
-app = Flask(__name__)
-# CORS(app, supports_credentials=True, resources={
-#     r"/api/*": {
-#         "origins": ["http://localhost:3000"],  # Replace with your frontend URL
-#         "methods": ["GET", "POST", "PUT", "DELETE"],
-#         "allow_headers": ["Content-Type", "Authorization"],
-#         "Access-Control-Allow-Credentials": True,
-#         'Access-Control-Allow-Origin': '*'
-#     }
-# })
-CORS(app, supports_credentials=True)
-app.config["SECRET_KEY"] = os.getenv("SECRET_KEY")
-app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
-jwt = JWTManager(app)
-
-# Initialize the database connection
-db = get_db()
-
-app.register_blueprint(products_bp, url_prefix='/api')
-app.register_blueprint(users_bp, url_prefix='/api')
-app.register_blueprint(blogs_bp, url_prefix='/api')
-app.register_blueprint(categories_bp, url_prefix='/api')
+# Nothing here touches Mongo: collections are bound lazily on first use, and index creation
+# and cache loading run in the background while /readyz reports the process as not ready
+db = lazy_db()
+
+def check_if_token_revoked(jwt_header, jwt_payload):
+    # Revoking a login's refresh token also ends every access token issued under it
+    refresh_jti = jwt_payload.get("refresh_jti")
+    return is_revoked(jwt_payload["jti"]) or (refresh_jti is not None and is_revoked(refresh_jti))
+
+def stats():
+    return jsonify({"mongo_pool": pool_stats.snapshot(), "cache": cache_stats(), "passwords": password_stats(),
+                    "startup": startup.snapshot()}), 200
+
+def metrics_snapshot():
+    return local_snapshot(pool_stats.snapshot(), cache_stats(), password_stats())
+
+def metrics():
+    # With METRICS_DIR set (gunicorn.conf.py does), the figures are summed over every worker
+    snapshot = metrics_snapshot()
+    directory = get_config()["METRICS_DIR"]
+    if directory:
+        snapshot = shared_snapshot(directory, snapshot)
+    return Response(render_prometheus(snapshot), mimetype="text/plain; version=0.0.4")
+
+def flush_metrics():
+    # Final snapshot from a worker that is about to exit
+    if get_config()["METRICS_DIR"]:
+        write_snapshot(get_config()["METRICS_DIR"], metrics_snapshot())
+
+def start_background_tasks():
+    # Threads do not survive fork, so under gunicorn every worker calls this after forking
+    start_warm_up(db)
+    config = get_config()
+    if config["METRICS_DIR"]:
+        start_writer(config["METRICS_DIR"], config["METRICS_WRITE_INTERVAL"], metrics_snapshot)
+
+def create_app():
+    app = Flask(__name__)
+    app.json = (ORJSONProvider if orjson_enabled() else MongoJSONProvider)(app)
+    # CORS(app, supports_credentials=True, resources={
+    #     r"/api/*": {
+    #         "origins": ["http://localhost:3000"],  # Replace with your frontend URL
+    #         "methods": ["GET", "POST", "PUT", "DELETE"],
+    #         "allow_headers": ["Content-Type", "Authorization"],
+    #         "Access-Control-Allow-Credentials": True,
+    #         'Access-Control-Allow-Origin': '*'
+    #     }
+    # })
+    CORS(app, supports_credentials=True)
+    app.config["SECRET_KEY"] = os.getenv("SECRET_KEY")
+    app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY")
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
+    jwt = JWTManager(app)
+    jwt.token_in_blocklist_loader(check_if_token_revoked)
+    init_metrics(app)
+
+    app.register_blueprint(products_bp, url_prefix='/api')
+    app.register_blueprint(users_bp, url_prefix='/api')
+    app.register_blueprint(blogs_bp, url_prefix='/api')
+    app.register_blueprint(categories_bp, url_prefix='/api')
+    app.register_blueprint(migrations_bp, url_prefix='/api')
+    app.register_blueprint(health_bp)
+    app.add_url_rule("/api/stats", view_func=stats, methods=["GET"])
+    app.add_url_rule("/metrics", view_func=metrics, methods=["GET"])
+
+    startup.app_created(IMPORT_STARTED)
+    # Password hash workers re-import the main module (python server/app.py) when they start;
+    # they must not warm up or listen like a server process
+    if get_config()["START_BACKGROUND_TASKS"] and multiprocessing.parent_process() is None:
+        start_background_tasks()
+    return app
+
+app = create_app()
 
 if __name__ == "__main__":  
     serve(app, host='127.0.0.0', port=5000) 
\ No newline at end of file
@@ -0,0 +1,419 @@
+import asyncio
+import os
+from bson import ObjectId
+from quart import Quart, Blueprint, request, jsonify
+from quart.json.provider import DefaultJSONProvider
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.exceptions import NotFound, MethodNotAllowed
+from werkzeug.http import generate_etag, parse_accept_header
+from werkzeug.routing import RequestRedirect
+from db.mongo_client import get_async_db
+from db.category_names import CATEGORY_NAMES, find_category, lookup_query, name_map
+from db.pagination import keyset_page_async, fetch_page_async, parse_include_total, page_count
+from db.search import search_query, search_sort
+from db.slugs import slugify
+from db.cache import get_cache
+from models.blog import blog_dumper
+from routes.blogs import RECENT_FIRST, requested_projection as blog_projection
+from routes.products import requested_projection as product_projection, category_fields
+from routes.categories import category_item, category_list_item
+from routes.conditional import validators
+from routes.streaming import NDJSON
+from server.app import app as wsgi_app
+from server.serialization import BSONDefaultMixin, ORJSONMixin, orjson_enabled
+from server.metrics import init_async_metrics
+
+# Async entry point: the unauthenticated read routes are served by Quart handlers on
+# pymongo's async driver, with the same URLs and response bodies as the Flask blueprints.
+# Everything else (writes, auth, streaming and conditional requests) is passed through to
+# the Flask app, so the two modes can be benchmarked side by side on the same port.
+#
+#   hypercorn server.asgi:app --bind 127.0.0.1:5000
+#   python -m server.asgi
+
+class MongoJSONProvider(BSONDefaultMixin, DefaultJSONProvider):
+    pass
+
+class ORJSONProvider(ORJSONMixin, MongoJSONProvider):
+    pass
+
+async_app = Quart(__name__)
+async_app.json = (ORJSONProvider if orjson_enabled() else MongoJSONProvider)(async_app)
+init_async_metrics(async_app)
+
+products_bp = Blueprint('products', __name__)
+blogs_bp = Blueprint('blogs', __name__)
+categories_bp = Blueprint('categories', __name__)
+
+def collection(name):
+    return get_async_db().get_collection(name)
+
+@async_app.after_request
+async def add_cors_headers(response):
+    # Mirrors CORS(app, supports_credentials=True) on the Flask app
+    origin = request.headers.get("Origin")
+    if origin:
+        response.headers["Access-Control-Allow-Origin"] = origin
+        response.headers["Access-Control-Allow-Credentials"] = "true"
+        response.headers.add("Vary", "Origin")
+    return response
+
+async def find_cached(name, collection_name, doc_id):
+    cache = get_cache(name)
+    doc = cache.get(str(doc_id))
+    if doc is None:
+        doc = await collection(collection_name).find_one({"_id": doc_id})
+        if doc is not None:
+            cache.set(str(doc_id), doc)
+    # Serialisation modifies the document; keep the cached copy intact
+    return dict(doc) if doc is not None else None
+
+def with_validators(response, doc, updated_field):
+    # The ETag and Last-Modified the Flask routes send; requests carrying validators are
+    # dispatched to Flask, so the 304 itself never has to be answered here
+    etag, last_modified = validators(doc, updated_field)
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    return response
+
+async def with_list_etag(response):
+    # Same body hash as conditional_list (werkzeug's add_etag), not Quart's md5 one
+    response.set_etag(generate_etag(await response.get_data()))
+    return response
+
+async def category_by_name(name):
+    cache = get_cache(CATEGORY_NAMES)
+    names = cache.get('all')
+    if names is None:
+        names = name_map([c async for c in collection('categories').find()])
+        cache.set('all', names)
+    category = find_category(names, name)
+    if category is not None:
+        return category
+    # Same fallback as db.category_names.category_by_name
+    for query, collation in lookup_query(name):
+        category = await collection('categories').find_one(query, collation=collation)
+        if category is not None:
+            cache.invalidate('all')
+            return category
+    return None
+
+# Products
+
+@products_bp.route("/products", methods=["GET"])
+async def get_products():
+    try:
+        projection = product_projection(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 422
+
+    products = await collection('products').find({}, projection).to_list(None)
+    category_fields(products, projection)
+    if projection is None or "images" in projection:
+        for product in products:
+            product["images"] = product.get("images", [])
+    return await with_list_etag(jsonify(products))
+
+@products_bp.route("/products/filter", methods=["POST"])
+async def get_productsFiltered():
+    try:
+        data = await request.get_json()
+        if not isinstance(data, dict):
+            return jsonify({"error": "Invalid input format, expected JSON object"}), 422
+
+        keyword = data.get('keyword', '')
+        sort = data.get('sort', 'recent')
+        try:
+            page = int(data.get('page', 1))
+            limit = int(data.get('limit', 10))
+        except ValueError:
+            return jsonify({"error": "Page and limit must be integers"}), 422
+
+        try:
+            query = search_query(keyword, data.get('mode', 'regex'), ["name"])
+            projection = product_projection(data)
+            include_total = parse_include_total(data.get('include_total'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 422
+
+        if 'cursor' in data:
+            try:
+                products, total_products, next_cursor = await keyset_page_async(
+                    collection('products'), query, "createdAt", data.get('cursor'), limit, include_total, projection)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            category_fields(products, projection)
+            return jsonify({
+                "items": products,
+                "total": total_products,
+                "next_cursor": next_cursor
+            }), 200
+
+        products, total_products, has_next = await fetch_page_async(
+            collection('products'), query, search_sort(query, sort, "createdAt"), limit,
+            skip=(page - 1) * limit, include_total=include_total, projection=projection
+        )
+        category_fields(products, projection)
+        for product in products:
+            product.pop("score", None)
+        return jsonify({
+            "items": products,
+            "total": total_products,
+            "page": page,
+            "pages": page_count(total_products, limit),
+            "has_next": has_next
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@products_bp.route('/products/ids', methods=['GET'])
+async def get_all_products_ids():
+    products = await collection('products').find({}, {'_id': 1}).to_list(None)
+    return await with_list_etag(jsonify([str(product['_id']) for product in products]))
+
+@products_bp.route("/products/<product_id>", methods=["GET"])
+async def get_product(product_id):
+    product = await find_cached("product", 'products', ObjectId(product_id))
+    if not product:
+        return jsonify({"error": "Product not found"}), 404
+    category_fields([product])
+    product["images"] = product.get("images", [])
+    return with_validators(jsonify(product), product, "updatedAt")
+
+@products_bp.route("/products/category/<category_id>", methods=["GET"])
+async def get_products_by_category(category_id):
+    try:
+        projection = product_projection(request.args)
+        products = await collection('products').find({"categoryId": ObjectId(category_id)}, projection).to_list(None)
+        return await with_list_etag(jsonify(category_fields(products, projection)))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@products_bp.route('/products/category/<category_name>/name', methods=['GET'])
+async def get_products_by_category_name(category_name):
+    category = await category_by_name(category_name)
+    if not category:
+        return jsonify([]), 200
+    try:
+        projection = product_projection(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 422
+
+    cursor = collection('products').find({"categoryId": category["_id"]}, projection).sort("createdAt", -1)
+    if "page" in request.args:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', 10))
+        cursor = cursor.skip((page - 1) * per_page).limit(per_page)
+
+    products = await cursor.to_list(None)
+    for product in products:
+        if "categoryId" in product:
+            product["categoryId"] = str(product["categoryId"])
+            product["categoryName"] = category["name"].lower()
+    return await with_list_etag(jsonify(products))
+
+# Blogs
+
+@blogs_bp.route("/blogs/all", methods=["GET"])
+async def get_all_blogs():
+    try:
+        projection, dumper = blog_projection(request.args)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+    blogs = await collection('blogs').find({}, projection).sort("created_at", -1).to_list(None)
+    return await with_list_etag(jsonify(dumper.dump(blogs)))
+
+@blogs_bp.route("/blogs", methods=["GET"])
+async def get_blogs():
+    status = request.args.get('status', 'published')
+    page = int(request.args.get('page', 1))
+    per_page = int(request.args.get('per_page', 10))
+    query = {"status": status}
+
+    try:
+        projection, dumper = blog_projection(request.args)
+        include_total = parse_include_total(request.args.get('include_total'))
+        if 'cursor' in request.args:
+            blogs, total, next_cursor = await keyset_page_async(
+                collection('blogs'), query, "created_at", request.args.get('cursor'), per_page, include_total, projection)
+            return await with_list_etag(jsonify({
+                "blogs": dumper.dump(blogs),
+                "total": total,
+                "per_page": per_page,
+                "next_cursor": next_cursor
+            }))
+        blogs, total, has_next = await fetch_page_async(collection('blogs'), query, RECENT_FIRST, per_page,
+                                                        skip=(page - 1) * per_page, include_total=include_total, projection=projection)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    return await with_list_etag(jsonify({
+        "blogs": dumper.dump(blogs),
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "total_pages": page_count(total, per_page),
+        "has_next": has_next
+    }))
+
+@blogs_bp.route("/blogs/filter", methods=["POST"])
+async def filter_blogs():
+    data = await request.get_json()
+    page = int(data.get('page', 1))
+    per_page = int(data.get('per_page', 10))
+    keyword = data.get('keyword', '')
+    sort = data.get('sort', 'recent')
+
+    try:
+        query = search_query(keyword, data.get('mode', 'regex'), ["title", "content"])
+        projection, dumper = blog_projection(data)
+        include_total = parse_include_total(data.get('include_total'))
+        if 'cursor' in data:
+            blogs, total, next_cursor = await keyset_page_async(
+                collection('blogs'), query, "created_at", data.get('cursor'), per_page, include_total, projection)
+            return jsonify({
+                "items": dumper.dump(blogs),
+                "total": total,
+                "next_cursor": next_cursor
+            }), 200
+        blogs, total, has_next = await fetch_page_async(collection('blogs'), query, search_sort(query, sort, "created_at"), per_page,
+                                                        skip=(page - 1) * per_page, include_total=include_total, projection=projection)
+    except ValueError as e:
+        return jsonify({"message": str(e)}), 400
+
+    return jsonify({
+        "items": dumper.dump(blogs),
+        "total": total,
+        "page": page,
+        "pages": page_count(total, per_page),
+        "has_next": has_next
+    }), 200
+
+@blogs_bp.route("/blogs/<blog_id>", methods=["GET"])
+async def get_blog(blog_id):
+    try:
+        blog = await find_cached("blog", 'blogs', ObjectId(blog_id))
+        if not blog:
+            return jsonify({"message": "Blog not found"}), 404
+        return with_validators(jsonify(blog_dumper.dump(blog)), blog, "updated_at")
+    except Exception as e:
+        return jsonify({"message": "Invalid blog ID"}), 400
+
+@blogs_bp.route("/blogs/<blog_name>/name", methods=["GET"])
+async def get_blog_by_name(blog_name):
+    blog = await collection('blogs').find_one({"slug": slugify(blog_name)})
+    if not blog:
+        blog = await collection('blogs').find_one({"title": blog_name.replace("-", " "), "slug": {"$exists": False}})
+    if not blog:
+        return jsonify({"message": "Blog not found"}), 404
+    return with_validators(jsonify(blog_dumper.dump(blog)), blog, "updated_at")
+
+# Categories
+
+@categories_bp.route('/categories', methods=['GET'])
+async def get_categories():
+    cache = get_cache('categories')
+    categories = cache.get('all')
+    if categories is None:
+        categories = [category_list_item(c) async for c in collection('categories').find()]
+        cache.set('all', categories)
+    return await with_list_etag(jsonify(categories))
+
+@categories_bp.route('/categories/filter', methods=['POST'])
+async def filter_categories():
+    data = await request.get_json()
+    page = int(data.get('page', 1))
+    per_page = int(data.get('per_page', 10))
+    keyword = data.get('keyword', '')
+    sort = data.get('sort', 'recent')
+
+    try:
+        query = search_query(keyword, data.get('mode', 'regex'), ['name'])
+        include_total = parse_include_total(data.get('include_total'))
+        if 'cursor' in data:
+            categories, total, next_cursor = await keyset_page_async(
+                collection('categories'), query, 'created_at', data.get('cursor'), per_page, include_total)
+            return jsonify({
+                'items': [category_item(c) for c in categories],
+                'total': total,
+                'next_cursor': next_cursor
+            })
+        categories, total, has_next = await fetch_page_async(collection('categories'), query, search_sort(query, sort, 'created_at'), per_page,
+                                                             skip=(page - 1) * per_page, include_total=include_total)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    return jsonify({
+        'items': [category_item(c) for c in categories],
+        'page': page,
+        'pages': page_count(total, per_page),
+        'total': total,
+        'has_next': has_next
+    })
+
+@categories_bp.route('/categories/<id>', methods=['GET'])
+async def get_category(id):
+    category = await find_cached('category', 'categories', ObjectId(id))
+    if not category:
+        return jsonify({'message': 'Category not found'}), 404
+    return with_validators(jsonify({
+        'id': str(category['_id']),
+        'name': category['name'],
+        'image': category['image'] if 'image' in category else None,
+        'imageKey': category['imageKey'] if 'imageKey' in category else None,
+    }), category, 'updated_at')
+
+@categories_bp.route('/categories/<name>/name', methods=['GET'])
+async def get_categorie_by_name(name):
+    category = await category_by_name(name.replace('_', ' '))
+    if not category:
+        return jsonify({'message': 'Category not found'}), 404
+    return with_validators(jsonify({
+        'name': category['name'],
+        'image': category['image'] if 'image' in category else None,
+    }), category, 'updated_at')
+
+async_app.register_blueprint(products_bp, url_prefix='/api')
+async_app.register_blueprint(blogs_bp, url_prefix='/api')
+async_app.register_blueprint(categories_bp, url_prefix='/api')
+
+class Dispatcher:
+    # Routes each HTTP request by the endpoint Flask would pick for it: endpoints that have
+    # an async handler (same blueprint and function name) go to Quart, the rest to Flask
+    def __init__(self, async_app, wsgi_app):
+        self.async_app = async_app
+        self.wsgi_app = WsgiToAsgi(wsgi_app)
+        self.adapter = wsgi_app.url_map.bind("")
+
+    def serves_async(self, scope):
+        headers = dict(scope.get("headers") or [])
+        # Streaming (?format= or Accept: application/x-ndjson, as stream_format reads them) and
+        # conditional requests are only implemented by the Flask app
+        if b"format=" in scope.get("query_string", b""):
+            return False
+        if parse_accept_header(headers.get(b"accept", b"").decode("latin-1"), MIMEAccept).best == NDJSON:
+            return False
+        if b"if-none-match" in headers or b"if-modified-since" in headers:
+            return False
+        try:
+            endpoint, _ = self.adapter.match(scope["path"], method=scope["method"])
+        except (NotFound, MethodNotAllowed, RequestRedirect):
+            return False
+        return endpoint in self.async_app.view_functions
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan" or (scope["type"] == "http" and self.serves_async(scope)):
+            await self.async_app(scope, receive, send)
+        else:
+            await self.wsgi_app(scope, receive, send)
+
+app = Dispatcher(async_app, wsgi_app)
+
+if __name__ == "__main__":
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+    config = Config()
+    config.bind = [os.getenv("ASGI_BIND", "127.0.0.1:5000")]
+    asyncio.run(serve(app, config))
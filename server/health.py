@@ -0,0 +1,117 @@
+import time
+import logging
+import threading
+import pymongo
+from flask import Blueprint, jsonify
+from pymongo.errors import PyMongoError
+from db.mongo_client import get_client, lazy_db
+from db.cache import start_invalidation_listener
+from db.category_names import category_names
+from db.indexes import blocked_by_duplicates, ensure_indexes, missing_indexes, warn_collection_scans
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+health_bp = Blueprint('health', __name__)
+
+# Longest pause between warm-up attempts while Mongo is unreachable
+MAX_RETRY_DELAY = 30
+
+class Startup:
+    # Times from the start of importing the app to the app being built and to warm-up
+    # (indexes checked, caches loaded) finishing; the process is ready only after both
+    def __init__(self):
+        self.began = None
+        self.app_seconds = None
+        self.ready_seconds = None
+        self.missing_indexes = []
+        # Unique indexes that existing duplicates keep from being built; reported, not waited on
+        self.blocked_indexes = []
+        self.attempts = 0
+        self.error = None
+
+    def app_created(self, began):
+        if self.app_seconds is None:
+            self.began = began
+            self.app_seconds = time.perf_counter() - began
+            logger.info("App created %.1fms after startup", self.app_seconds * 1000)
+
+    def warmed_up(self):
+        self.ready_seconds = time.perf_counter() - (self.began or time.perf_counter())
+        logger.info("Warm-up finished %.1fms after startup (%d attempts)", self.ready_seconds * 1000, self.attempts)
+
+    def snapshot(self):
+        return {
+            "app_ms": round(self.app_seconds * 1000, 1) if self.app_seconds is not None else None,
+            "ready_ms": round(self.ready_seconds * 1000, 1) if self.ready_seconds is not None else None,
+            "warm_up_attempts": self.attempts,
+            "warm_up_error": self.error,
+        }
+
+startup = Startup()
+
+def warm_up(db):
+    # Retried with backoff until Mongo answers, so a database that is down at startup only
+    # delays readiness instead of failing the import or the worker
+    config = get_config()
+    delay = 1
+    while True:
+        startup.attempts += 1
+        try:
+            if config["ENSURE_INDEXES"]:
+                startup.blocked_indexes = blocked_by_duplicates(ensure_indexes(db))
+            startup.missing_indexes = missing_indexes(db)
+            if config["CHECK_QUERY_PLANS"]:
+                warn_collection_scans(db)
+            category_names(db)
+            if config["CACHE_INVALIDATION_CHANNEL"]:
+                start_invalidation_listener(db)
+            break
+        except PyMongoError as e:
+            startup.error = str(e)
+            logger.warning("Warm-up failed, retrying in %ds: %s", delay, e)
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+    startup.error = None
+    startup.warmed_up()
+
+_warm_up_thread = None
+
+def start_warm_up(db):
+    # Once per process, however many apps it creates
+    global _warm_up_thread
+    if _warm_up_thread is None:
+        _warm_up_thread = threading.Thread(target=warm_up, args=(db,), name="warm-up", daemon=True)
+        _warm_up_thread.start()
+    return _warm_up_thread
+
+@health_bp.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness: the process is up and serving requests
+    return jsonify({'status': 'ok'}), 200
+
+@health_bp.route('/readyz', methods=['GET'])
+def readyz():
+    # Readiness: Mongo answers, the declared indexes exist and warm-up has loaded the caches.
+    # A unique index blocked by duplicates does not hold readiness back: no restart fixes the
+    # data, so it is listed under blocked_indexes until the duplicates are merged.
+    warmed_up = startup.ready_seconds is not None
+    checks = {'mongo': 'ok', 'indexes': 'warming up', 'caches': 'warming up'}
+    try:
+        with pymongo.timeout(get_config()["READY_TIMEOUT_MS"] / 1000):
+            get_client().admin.command('ping')
+            if warmed_up and startup.missing_indexes:
+                # They may have been built by hand since; look again until they all exist
+                startup.missing_indexes = missing_indexes(lazy_db())
+    except PyMongoError as e:
+        checks['mongo'] = str(e)
+    blocked = [name for name in startup.missing_indexes if name in startup.blocked_indexes]
+    if warmed_up:
+        missing = [name for name in startup.missing_indexes if name not in blocked]
+        checks['indexes'] = 'ok' if not missing else {'missing': missing}
+        checks['caches'] = 'ok'
+    ready = all(check == 'ok' for check in checks.values())
+    body = {'status': 'ready' if ready else 'not ready', 'checks': checks, 'startup': startup.snapshot()}
+    if blocked:
+        body['blocked_indexes'] = blocked
+    return jsonify(body), 200 if ready else 503
@@ -0,0 +1,139 @@
+import time
+import logging
+import threading
+from flask import g, request
+from db.command_stats import current_route, current_tally, command_stats
+from config import get_config
+
+logger = logging.getLogger(__name__)
+
+# Request latency histogram buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RequestStats:
+    # Latency histogram per (method, endpoint) and response count per (method, endpoint, status)
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = {}
+        self.statuses = {}
+
+    def observe(self, method, endpoint, status, seconds):
+        with self._lock:
+            histogram = self.latency.setdefault((method, endpoint), {"buckets": [0] * len(BUCKETS), "count": 0, "sum": 0.0})
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+            histogram["count"] += 1
+            histogram["sum"] += seconds
+            key = (method, endpoint, status)
+            self.statuses[key] = self.statuses.get(key, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            latency = {key: {"buckets": list(h["buckets"]), "count": h["count"], "sum": h["sum"]} for key, h in self.latency.items()}
+            return latency, dict(self.statuses)
+
+request_stats = RequestStats()
+
+def _start_request(endpoint):
+    tally = {"commands": 0, "seconds": 0.0}
+    current_route.set(endpoint or "unmatched")
+    current_tally.set(tally)
+    return time.perf_counter(), tally
+
+def _finish_request(method, endpoint, path, status, start, tally):
+    seconds = time.perf_counter() - start
+    request_stats.observe(method, endpoint, status, seconds)
+    current_route.set("background")
+    current_tally.set(None)
+    slow_ms = get_config()["SLOW_REQUEST_MS"]
+    if slow_ms and seconds * 1000 >= slow_ms:
+        logger.warning("Slow request %s %s -> %d: %.1fms, %d Mongo commands taking %.1fms",
+                       method, path, status, seconds * 1000, tally["commands"], tally["seconds"] * 1000)
+
+def init_metrics(app):
+    # Times every request from routing until its response body is fully sent (so streamed
+    # responses count in full) and tags Mongo commands issued meanwhile with the endpoint
+    @app.before_request
+    def start_timer():
+        g.metrics_start, g.metrics_tally = _start_request(request.endpoint)
+
+    @app.after_request
+    def record_request(response):
+        start = g.get("metrics_start")
+        if start is None:
+            return response
+        method, endpoint, path, status, tally = request.method, request.endpoint or "unmatched", request.path, response.status_code, g.metrics_tally
+        response.call_on_close(lambda: _finish_request(method, endpoint, path, status, start, tally))
+        return response
+
+def init_async_metrics(app):
+    # The same for the Quart app in server/asgi.py. Its handlers return whole bodies, so the
+    # request is timed up to after_request. Endpoints keep the Flask names, so both entry
+    # points report into the same series.
+    from quart import g, request
+
+    @app.before_request
+    async def start_timer():
+        g.metrics_start, g.metrics_tally = _start_request(request.endpoint)
+
+    @app.after_request
+    async def record_request(response):
+        start = g.get("metrics_start")
+        if start is not None:
+            _finish_request(request.method, request.endpoint or "unmatched", request.path,
+                            response.status_code, start, g.metrics_tally)
+        return response
+
+def _labels(**labels):
+    return ",".join(f'{name}="{str(value)}"' for name, value in labels.items())
+
+def _format(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def local_snapshot(pool, caches, passwords):
+    # Everything /metrics reports, for this process
+    latency, statuses = request_stats.snapshot()
+    return {"latency": latency, "statuses": statuses, "commands": command_stats.snapshot(),
+            "pool": pool, "caches": caches, "passwords": passwords}
+
+def render_prometheus(snapshot):
+    # Prometheus text exposition format, version 0.0.4
+    latency, statuses = snapshot["latency"], snapshot["statuses"]
+    pool, caches, passwords = snapshot["pool"], snapshot["caches"], snapshot["passwords"]
+    lines = [
+        "# HELP http_request_duration_seconds Time from routing to the last byte of the response.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, endpoint), histogram in sorted(latency.items()):
+        for bound, count in zip(BUCKETS, histogram["buckets"]):
+            lines.append(f"http_request_duration_seconds_bucket{{{_labels(method=method, endpoint=endpoint, le=bound)}}} {count}")
+        lines.append(f"http_request_duration_seconds_bucket{{{_labels(method=method, endpoint=endpoint, le='+Inf')}}} {histogram['count']}")
+        lines.append(f"http_request_duration_seconds_sum{{{_labels(method=method, endpoint=endpoint)}}} {_format(histogram['sum'])}")
+        lines.append(f"http_request_duration_seconds_count{{{_labels(method=method, endpoint=endpoint)}}} {histogram['count']}")
+
+    lines += ["# HELP http_requests_total Responses by endpoint and status code.", "# TYPE http_requests_total counter"]
+    for (method, endpoint, status), count in sorted(statuses.items()):
+        lines.append(f"http_requests_total{{{_labels(method=method, endpoint=endpoint, status=status)}}} {count}")
+
+    commands = sorted(snapshot["commands"].items())
+    for metric, field, kind, help_text in (
+        ("mongo_commands_total", "count", "counter", "Mongo commands by the endpoint that issued them."),
+        ("mongo_command_failures_total", "failures", "counter", "Mongo commands that failed."),
+        ("mongo_command_seconds_total", "seconds", "counter", "Time spent in Mongo commands."),
+        ("mongo_documents_returned_total", "documents", "counter", "Documents returned by Mongo commands."),
+    ):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+        for (endpoint, command), stats in commands:
+            lines.append(f"{metric}{{{_labels(endpoint=endpoint, command=command)}}} {_format(stats[field])}")
+
+    for name, value in pool.items():
+        lines += [f"# TYPE mongo_pool_{name} gauge", f"mongo_pool_{name} {_format(value)}"]
+    for field in ("size", "hits", "misses", "evictions"):
+        kind = "gauge" if field == "size" else "counter"
+        lines.append(f"# TYPE cache_{field} {kind}")
+        for cache, stats in sorted(caches.items()):
+            lines.append(f"cache_{field}{{{_labels(cache=cache)}}} {stats[field]}")
+    for name, value in passwords.items():
+        lines += [f"# TYPE password_hash_{name} gauge", f"password_hash_{name} {_format(value)}"]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,52 @@
+import logging
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+from config import get_config
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+COMPACT = (",", ":")
+
+def bson_default(o):
+    # ObjectIds are written as their hex string, so routes can return documents as read
+    if isinstance(o, ObjectId):
+        return str(o)
+    return DefaultJSONProvider.default(o)
+
+class BSONDefaultMixin:
+    default = staticmethod(bson_default)
+
+class ORJSONMixin:
+    # Encodes compact, key-sorted output with orjson, datetimes still going through default.
+    # Non-ASCII output goes to json so it keeps its \u escapes. What still differs is
+    # floats below 1e-4 or from 1e16 up, which orjson writes as 0.00001 and 1e16 rather
+    # than 1e-05 and 1e+16, and NaN/Infinity, which it writes as null.
+    def dumps(self, obj, **kwargs):
+        if kwargs == {"separators": COMPACT} and self.sort_keys and self.ensure_ascii:
+            try:
+                out = orjson.dumps(obj, default=self.default,
+                                   option=orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+            except TypeError:
+                out = None
+            if out is not None and out.isascii():
+                return out.decode()
+        return super().dumps(obj, **kwargs)
+
+class MongoJSONProvider(BSONDefaultMixin, DefaultJSONProvider):
+    pass
+
+class ORJSONProvider(ORJSONMixin, MongoJSONProvider):
+    pass
+
+def orjson_enabled():
+    if get_config()["JSON_PROVIDER"] != "orjson":
+        return False
+    if orjson is None:
+        logger.warning("JSON_PROVIDER=orjson but orjson is not installed; using json")
+        return False
+    return True
@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import fcntl
+import logging
+import threading
+from contextlib import contextmanager
+from server.metrics import BUCKETS
+
+logger = logging.getLogger(__name__)
+
+# Every gunicorn worker writes its metrics snapshot to METRICS_DIR/<pid>.json, and /metrics
+# sums all of them, so a scrape reports the same totals whichever worker answers it. Counters
+# of workers that have exited are folded into ARCHIVE, so totals never go backwards when
+# max_requests recycles a worker. Gauges (pool, caches, passwords) come from live workers only.
+ARCHIVE = "archive.json"
+LOCK = "archive.lock"
+COUNTERS = ("latency", "statuses", "commands")
+
+def _encode(snapshot):
+    # JSON has no tuple keys; (method, endpoint) and friends are stored as [key, value] pairs
+    return {name: [[list(key), value] for key, value in values.items()] if name in COUNTERS else values
+            for name, values in snapshot.items()}
+
+def _decode(data):
+    return {name: {tuple(key): value for key, value in values} if name in COUNTERS else values
+            for name, values in data.items()}
+
+def _empty():
+    return {"latency": {}, "statuses": {}, "commands": {}}
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return _decode(json.load(f))
+    except (OSError, ValueError):
+        return None
+
+def _write(path, snapshot):
+    # Written aside and renamed, so readers never see half a file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(_encode(snapshot), f)
+    os.replace(tmp, path)
+
+def write_snapshot(directory, snapshot):
+    _write(os.path.join(directory, f"{os.getpid()}.json"), snapshot)
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _merge_counters(total, snapshot):
+    for key, histogram in snapshot["latency"].items():
+        into = total["latency"].setdefault(key, {"buckets": [0] * len(BUCKETS), "count": 0, "sum": 0.0})
+        into["buckets"] = [a + b for a, b in zip(into["buckets"], histogram["buckets"])]
+        into["count"] += histogram["count"]
+        into["sum"] += histogram["sum"]
+    for key, count in snapshot["statuses"].items():
+        total["statuses"][key] = total["statuses"].get(key, 0) + count
+    for key, stats in snapshot["commands"].items():
+        into = total["commands"].setdefault(key, {field: 0 for field in stats})
+        for field, value in stats.items():
+            into[field] = into.get(field, 0) + value
+
+def _sum_stats(stats):
+    # Sums each figure over the workers; maxima and peaks take the largest instead
+    total = {}
+    for worker in stats:
+        for name, value in worker.items():
+            if isinstance(value, (int, float)):
+                total[name] = max(total.get(name, value), value) if "max" in name or "peak" in name else total.get(name, 0) + value
+    return total
+
+@contextmanager
+def _archive_lock(directory):
+    with open(os.path.join(directory, LOCK), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def shared_snapshot(directory, snapshot):
+    # This worker's figures are written fresh; the others' are at most METRICS_WRITE_INTERVAL old
+    write_snapshot(directory, snapshot)
+    live = []
+    with _archive_lock(directory):
+        archive = _read(os.path.join(directory, ARCHIVE)) or _empty()
+        exited = []
+        for name in os.listdir(directory):
+            stem, ext = os.path.splitext(name)
+            if ext != ".json" or not stem.isdigit():
+                continue
+            worker = _read(os.path.join(directory, name))
+            if worker is None:
+                continue
+            if _alive(int(stem)):
+                live.append(worker)
+            else:
+                _merge_counters(archive, worker)
+                exited.append(name)
+        if exited:
+            _write(os.path.join(directory, ARCHIVE), archive)
+            for name in exited:
+                os.remove(os.path.join(directory, name))
+
+    total = _empty()
+    for worker in [archive] + live:
+        _merge_counters(total, worker)
+    total["pool"] = _sum_stats([worker["pool"] for worker in live])
+    if total["pool"].get("checkouts"):
+        total["pool"]["wait_time_avg_ms"] = round(total["pool"]["wait_time_total_ms"] / total["pool"]["checkouts"], 3)
+    total["caches"] = {name: _sum_stats([worker["caches"][name] for worker in live if name in worker["caches"]])
+                       for name in {name for worker in live for name in worker["caches"]}}
+    total["passwords"] = _sum_stats([worker["passwords"] for worker in live])
+    count = total["passwords"].get("hashes", 0) + total["passwords"].get("verifications", 0)
+    total["passwords"]["avg_seconds"] = total["passwords"].get("total_seconds", 0.0) / count if count else 0.0
+    return total
+
+def clear(directory):
+    # Called by the gunicorn master on start, so figures from an earlier run are not carried over
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.endswith(".json") or name.endswith(".tmp"):
+            os.remove(os.path.join(directory, name))
+
+def start_writer(directory, interval, collect):
+    # Keeps this worker's file current between scrapes that land on other workers
+    def write():
+        while True:
+            time.sleep(interval)
+            try:
+                write_snapshot(directory, collect())
+            except OSError as e:
+                logger.warning("Could not write metrics to %s: %s", directory, e)
+    thread = threading.Thread(target=write, name="metrics-writer", daemon=True)
+    thread.start()
+    return thread